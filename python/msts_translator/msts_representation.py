@@ -1,32 +1,118 @@
-import json
-from input_types import *
+from __future__ import annotations
 import argparse
+import json
 import pathlib
-import networkx
+import sys
+import numpy
+from tabu_search.compiled_graph import CompiledGraph
+from tabu_search.loader import load_instance
+from tabu_search.sampling import levels
+from tabu_search.types import TabuGraph
+
+# MSTS text format, operations and employees by index, jobs by index into
+# compiled.job_names, which write_jobs puts one per line so line i names job i:
+#   #operations #edges #employees
+#   one line per edge, "before after job": after waits on before, job is after's
+#   one line per operation, "k e1 d1 ... ek dk": the k employees that can do it
+#   and how long each takes
+# Solver output is one line per operation, "operation employee start", anything
+# after start is ignored, as are blank lines and lines starting with #.
+
+# Lines are joined in chunks of this many before they are written
+CHUNK = 65536
+
+def _chunks(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+# Every line of the translation, header first
+def msts_lines(compiled: CompiledGraph, employees: list[str]):
+    graph = TabuGraph(compiled)
+    graph.set_employees(employees)
+    processing = graph.processing
+    yield f"{compiled.num_nodes} {compiled.num_edges} {len(employees)}\n"
+    waiting = numpy.repeat(numpy.arange(compiled.num_nodes), numpy.diff(compiled.dep_offsets))
+    jobs = compiled.jobs[waiting]
+    for before, after, job in zip(compiled.dep_indices.tolist(), waiting.tolist(), jobs.tolist()):
+        yield f"{before} {after} {job}\n"
+    if processing is None:
+        # everyone takes the same, only the duration changes per row
+        columns = list(range(len(employees)))
+        for d in compiled.durations.tolist():
+            yield f"{len(employees)} " + " ".join(f"{e} {d}" for e in columns) + "\n"
+        return
+    for row in processing.tolist():
+        eligible = [(e, d) for e, d in enumerate(row) if d >= 0]
+        yield f"{len(eligible)} " + " ".join(f"{e} {d}" for e, d in eligible) + "\n"
+
+def write_msts(compiled: CompiledGraph, employees: list[str], file):
+    for chunk in _chunks(msts_lines(compiled, employees)):
+        file.write(chunk)
+
+# The job names the job ids in the edge lines stand for, job i on line i
+def write_jobs(compiled: CompiledGraph, file):
+    for chunk in _chunks(f"{name}\n" for name in compiled.job_names):
+        file.write(chunk)
+
+# Solver output back into assignments for TabuGraph.update_assignments, every
+# employee's operations in the order they start. Ties go to whatever comes
+# earlier in the task edges, so tasks taking no time stay after their deps.
+def read_solution(lines, compiled: CompiledGraph, employees: list[str]):
+    placed = dict()
+    for number, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        try:
+            operation, employee, start = (int(f) for f in fields[:3])
+        except ValueError:
+            raise ValueError(f"line {number}: expected \"operation employee start\", got {line.strip()!r}") from None
+        if not 0 <= operation < compiled.num_nodes or not 0 <= employee < len(employees):
+            raise ValueError(f"line {number}: no operation {operation} or employee {employee}")
+        if operation in placed:
+            raise ValueError(f"line {number}: operation {operation} placed twice")
+        placed[operation] = (employee, start)
+    if len(placed) != compiled.num_nodes:
+        missing = [compiled.names[n] for n in range(compiled.num_nodes) if n not in placed][:10]
+        raise ValueError(f"solution doesn't place {missing}")
+    level = numpy.empty(compiled.num_nodes, dtype=numpy.int64)
+    for l, group in enumerate(levels(compiled)):
+        level[group] = l
+    level = level.tolist()
+    sequences = [[] for _ in employees]
+    for operation, (employee, start) in sorted(placed.items(), key=lambda p: (p[1][1], level[p[0]], p[0])):
+        sequences[employee].append(compiled.names[operation])
+    return dict(zip(employees, sequences))
 
 def main(args):
-    f = open(args.filepath)
-    data = json.load(f)
-    operations = [Operation.from_dict(j) for j in data['operations']]
-    employees = [Employee.from_dict(dict({'id': i}, **e)) for i, e in enumerate(data['employees'])] 
-    num_employees = len(employees)
-
-    # build operations graph 
-    G = networkx.Graph()
-    for operation in operations:
-        G.add_node(operation.name)
-    for operation in operations:
-        for dep in operation.deps:
-            G.add_edge(operation.name, dep)
-
-    print(f"{G.number_of_nodes()} {G.number_of_edges()} {num_employees}")
-    for edge in G.edges():
-        print(f"{edge[0]} {edge[1]} J1") # TODO: make this correct instead of J1
-
-    for operation in operations:
-        print(f"{num_employees} " + " ".join([f"{employee.id} {operation.duration}" for employee in employees]))
+    instance = load_instance(args.filepath, use_cache=not args.no_cache)
+    if args.solution:
+        with open(args.solution) as f:
+            assignments = read_solution(f, instance.compiled, instance.employees)
+        graph = TabuGraph(instance.compiled)
+        graph.update_assignments(assignments)
+        print(json.dumps({'assignments': assignments, 'makespan': int(graph.completion_time())}))
+        return
+    if args.output:
+        with open(args.output, "w", buffering=1 << 20) as f:
+            write_msts(instance.compiled, instance.employees, f)
+    else:
+        write_msts(instance.compiled, instance.employees, sys.stdout)
+    if args.jobs:
+        with open(args.jobs, "w") as f:
+            write_jobs(instance.compiled, f)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process input operations file")
+    parser = argparse.ArgumentParser(description="Translate an operations file to MSTS, or read an MSTS solution back")
     parser.add_argument('filepath', type=pathlib.Path)
+    parser.add_argument('--output', type=pathlib.Path, default=None, help="write the translation here instead of stdout")
+    parser.add_argument('--jobs', type=pathlib.Path, default=None, help="also write the job names here, line i is job id i")
+    parser.add_argument('--solution', type=pathlib.Path, default=None, help="MSTS solver output to turn back into assignments and a makespan")
+    parser.add_argument('--no-cache', action='store_true', help="parse the input every time instead of going through the compiled cache")
     main(parser.parse_args())
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import numpy
+from tabu_search.instance_generator import KINDS, generate, parse_durations
+from tabu_search.sampling import best_random_sequences
+from tabu_search.search import TabuConfig, TabuSearch, random_assignments
+from tabu_search.types import Neighbourhood, build_graph
+
+# Seconds every call of f took, f is called repeat times
+def _time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return times
+
+def _summary(times):
+    return {'min': min(times), 'median': statistics.median(times), 'runs': len(times)}
+
+# Tabu search from the best of a random batch for solver_seconds, recording
+# (seconds, best makespan) every time the best improves
+def _solve(operations, num_employees, solver_seconds, seed):
+    start = time.perf_counter()
+    graph = build_graph(operations)
+    sampled_time, sequences = best_random_sequences(graph.compiled, num_employees, 256, rng=numpy.random.default_rng(seed))[0]
+    graph.load_sequences(sequences, [f"e{i}" for i in range(num_employees)])
+    search = TabuSearch(graph, TabuConfig(seed=seed, sample_size=200))
+    trace = [(time.perf_counter() - start, search.best_time)]
+    while time.perf_counter() - start < solver_seconds and search.best_time > search.lower_bound:
+        if search.step():
+            trace.append((time.perf_counter() - start, search.best_time))
+    return {'initial': sampled_time,
+            'best': search.best_time,
+            'lower_bound': search.lower_bound,
+            'iterations': search.iteration,
+            'seconds': time.perf_counter() - start,
+            'trace': trace}
+
+# get_valid_moves grows with #nodes times the critical path, past moves_limit
+# operations only the 200 move sample is timed
+def bench_instance(operations, num_employees, neighbourhood=Neighbourhood.N7, repeat=5, solver_seconds=1.0, seed=0, moves_limit=5000):
+    rng = random.Random(seed)
+    employees = [f"e{i}" for i in range(num_employees)]
+    graph = build_graph(operations)
+    assignments = random_assignments(graph, employees, rng)
+    graph.update_assignments(assignments)
+
+    def schedule():
+        graph.schedule_valid = False
+        graph.completion_time()
+
+    result = {'operations': len(operations),
+              'edges': graph.compiled.num_edges,
+              'build_graph': _summary(_time(lambda: build_graph(operations), repeat)),
+              'update_assignments': _summary(_time(lambda: graph.update_assignments(assignments), repeat)),
+              'completion_time': _summary(_time(schedule, repeat)),
+              'sample_moves': _summary(_time(lambda: graph.sample_moves(neighbourhood, 200, rng), repeat))}
+    if len(operations) <= moves_limit:
+        result['get_valid_moves'] = _summary(_time(lambda: graph.get_valid_moves(neighbourhood), repeat))
+        result['moves'] = len(graph.get_valid_moves(neighbourhood))
+    if solver_seconds:
+        result['solver'] = _solve(operations, num_employees, solver_seconds, seed)
+    return result
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(kinds, sizes, num_employees=5, fan_in=2, durations="uniform:1:9", neighbourhood=Neighbourhood.N7, repeat=5, solver_seconds=1.0, seed=0, moves_limit=5000):
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            operations = generate(kind, size, fan_in, parse_durations(durations), seed)
+            result = bench_instance(operations, num_employees, neighbourhood, repeat, solver_seconds, seed, moves_limit)
+            results.append(dict({'kind': kind, 'size': size}, **result))
+            print(f"{kind} {size}: build {result['build_graph']['median']:.4f}s, schedule {result['completion_time']['median']:.4f}s, "
+                  f"200 moves sampled in {result['sample_moves']['median']:.4f}s"
+                  + (f", {result['moves']} moves in {result['get_valid_moves']['median']:.4f}s" if 'moves' in result else "")
+                  + (f", best {result['solver']['best']} from {result['solver']['initial']}" if 'solver' in result else ""),
+                  file=sys.stderr)
+    return {'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'config': {'employees': num_employees, 'fan_in': fan_in, 'durations': durations,
+                       'neighbourhood': neighbourhood.name, 'repeat': repeat, 'solver_seconds': solver_seconds, 'seed': seed,
+                       'moves_limit': moves_limit},
+            'results': results}
+
+TIMINGS = ['build_graph', 'update_assignments', 'completion_time', 'sample_moves', 'get_valid_moves']
+
+# Timings that got more than threshold times slower than in baseline, as
+# (kind, size, what, baseline seconds, new seconds)
+def regressions(baseline, current, threshold=1.25):
+    old = {(r['kind'], r['size']): r for r in baseline['results']}
+    slower = []
+    for r in current['results']:
+        before = old.get((r['kind'], r['size']))
+        if before is None:
+            continue
+        for what in TIMINGS:
+            if what in r and what in before and r[what]['min'] > threshold * before[what]['min']:
+                slower.append((r['kind'], r['size'], what, before[what]['min'], r[what]['min']))
+    return slower
+
+def main(args):
+    results = run(args.kinds.split(","), [int(s) for s in args.sizes.split(",")], args.employees, args.fan_in, args.durations,
+                  Neighbourhood[args.neighbourhood.upper()], args.repeat, args.solver_seconds, args.seed, args.moves_limit)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(json.load(f), results, args.threshold)
+        for kind, size, what, before, after in slower:
+            print(f"REGRESSION {kind} {size} {what}: {before:.4f}s -> {after:.4f}s", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the solver on synthetic instances")
+    parser.add_argument('--kinds', default=",".join(KINDS), help="comma separated, from " + ", ".join(KINDS))
+    parser.add_argument('--sizes', default="10,100,1000,10000", help="comma separated operation counts")
+    parser.add_argument('--employees', type=int, default=5)
+    parser.add_argument('--fan-in', type=int, default=2)
+    parser.add_argument('--durations', default="uniform:1:9")
+    parser.add_argument('--neighbourhood', default="n7", help="which moves get_valid_moves is timed on, all, n5 or n7")
+    parser.add_argument('--moves-limit', type=int, default=5000, help="largest instance get_valid_moves is timed on")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--solver-seconds', type=float, default=1.0, help="time for each full solver run, 0 skips it")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=pathlib.Path, default=pathlib.Path("benchmark.json"))
+    parser.add_argument('--baseline', type=pathlib.Path, default=None, help="earlier --output to compare against, exits 1 on a regression")
+    parser.add_argument('--threshold', type=float, default=1.25, help="how many times slower than the baseline counts as a regression")
+    main(parser.parse_args())
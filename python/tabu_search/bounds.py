@@ -0,0 +1,67 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import numpy
+from tabu_search.compiled_graph import CompiledGraph
+
+# Lower bounds on the makespan of any assignment, from the task edges and the
+# number of employees alone. Every task comes before the last one, so all of
+# them count.
+@dataclass
+class LowerBounds:
+    critical_path: int # longest chain of durations
+    work: int # all the work split perfectly across the employees
+    # tasks that can't start before t still need t + their work / #employees,
+    # the best t over every head
+    heads: int
+    # same for tasks that have at least t of work waiting on them when they finish
+    tails: int
+
+    @property
+    def value(self):
+        return max(self.critical_path, self.work, self.heads, self.tails)
+
+# (head, tail) per task: the longest chain of durations before it starts and
+# after it finishes, ignoring employees. Runtime O(#nodes + #edges).
+def heads_and_tails(compiled: CompiledGraph, durations=None):
+    durations = (compiled.min_durations() if durations is None else durations).tolist()
+    dep_offsets = compiled.dep_offsets.tolist()
+    dep_indices = compiled.dep_indices.tolist()
+    dependent_offsets = compiled.dependent_offsets.tolist()
+    dependent_indices = compiled.dependent_indices.tolist()
+    remaining = numpy.diff(compiled.dep_offsets).tolist()
+    ready = [n for n, r in enumerate(remaining) if r == 0]
+    order = []
+    while ready:
+        n = ready.pop()
+        order.append(n)
+        for p in dependent_indices[dependent_offsets[n]:dependent_offsets[n + 1]]:
+            remaining[p] -= 1
+            if remaining[p] == 0:
+                ready.append(p)
+
+    head = [0] * len(durations)
+    for n in order:
+        head[n] = max((head[d] + durations[d] for d in dep_indices[dep_offsets[n]:dep_offsets[n + 1]]), default=0)
+    tail = [0] * len(durations)
+    for n in reversed(order):
+        tail[n] = max((tail[p] + durations[p] for p in dependent_indices[dependent_offsets[n]:dependent_offsets[n + 1]]), default=0)
+    return numpy.array(head, dtype=numpy.int64), numpy.array(tail, dtype=numpy.int64)
+
+# max over t of t + ceil(work of the tasks with release >= t / num_employees)
+def _release_bound(release, durations, num_employees):
+    order = numpy.argsort(-release, kind='stable')
+    work = numpy.cumsum(durations[order])
+    return int((release[order] - (-work // num_employees)).max(initial=0))
+
+# durations default to the fastest any employee does every task in
+def lower_bounds(compiled: CompiledGraph, num_employees, durations=None) -> LowerBounds:
+    durations = compiled.min_durations() if durations is None else durations
+    head, tail = heads_and_tails(compiled, durations)
+    return LowerBounds(critical_path=int((head + durations + tail).max(initial=0)),
+                       work=int(-(-int(durations.sum()) // num_employees)),
+                       heads=_release_bound(head, durations, num_employees),
+                       tails=_release_bound(tail, durations, num_employees))
+
+# How far makespan is above bound, as a fraction of makespan. 0 means it is optimal.
+def gap(makespan, bound):
+    return 0.0 if makespan <= bound else (makespan - bound) / makespan
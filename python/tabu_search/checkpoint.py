@@ -0,0 +1,163 @@
+from __future__ import annotations
+import hashlib
+import pathlib
+import time
+from array import array
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Optional
+import numpy
+from tabu_search.compiled_graph import CompiledGraph
+from tabu_search.instrumentation import Instrumentation
+from tabu_search.loader import InstanceError, padded, write_atomically
+from tabu_search.parallel import decode_sequences, encode_sequences
+from tabu_search.search import TabuConfig, TabuSearch
+from tabu_search.types import TabuGraph
+
+# Everything a TabuSearch needs to carry on exactly where it was. The compiled
+# graph isn't in it, only a digest to check it is resumed on the same one.
+@dataclass
+class Checkpoint:
+    num_nodes: int
+    digest: int # graph_digest of the compiled graph
+    employees: list[str]
+    config: TabuConfig
+    iteration: int
+    best_time: int
+    sequences: list # the current assignment, operation ids per employee
+    best_sequences: list
+    tabu_until: dict # same as TabuSearch.tabu_until
+    recent_fingerprints: list # oldest first
+    rng_state: tuple # random.Random.getstate()
+    budget_used: tuple # same as TabuSearch.budget_used
+
+# Binary layout, every section starts 8 byte aligned:
+#   magic, then int64 #nodes, digest, #employees, iteration, best makespan,
+#   #tabu entries, #recent fingerprints, byte length of config and employee
+#   names, 1 if the rng has a gauss_next, budget iterations and stagnant iterations
+#   float64 gauss_next and budget seconds, uint32 x 625 Mersenne Twister state
+#   current then best sequences, each encode_sequences
+#   int64 #tabu entries x 4 (task, machine, position, until), uint64 recent fingerprints
+#   TabuConfig JSON and employee names, NUL separated utf-8
+MAGIC = b"TSCHKPT\x02"
+HEADER = len(MAGIC) + 12 * 8
+RNG_WORDS = 625
+
+# Hash of the durations, processing times and task edges, as an int64
+def graph_digest(compiled: CompiledGraph):
+    digest = hashlib.sha256()
+    for a in (compiled.durations, compiled.dep_offsets, compiled.dep_indices, compiled.processing_times):
+        if a is not None:
+            digest.update(numpy.ascontiguousarray(a).tobytes())
+    return int(numpy.frombuffer(digest.digest()[:8], dtype=numpy.int64)[0])
+
+# Runtime O(#nodes), mostly copying the two assignments
+def save_checkpoint(path, search: TabuSearch, digest=None):
+    graph = search.graph
+    version, words, gauss_next = search.rng.getstate()
+    assert(version == 3 and len(words) == RNG_WORDS)
+    tabu = numpy.array([(n, m, i, until) for (n, m, i), until in search.tabu_until.items()], dtype=numpy.int64).reshape(-1, 4)
+    fingerprints = numpy.array(search.recent_fingerprints, dtype=numpy.uint64)
+    config = search.config.to_json().encode()
+    employees = "\0".join(graph.employees).encode()
+    budget_iterations, stagnant, seconds = search.budget_used
+    header = numpy.array([graph.compiled.num_nodes, digest if digest is not None else graph_digest(graph.compiled),
+                          len(graph.employees), search.iteration, search.best_time, len(tabu), len(fingerprints),
+                          len(config), len(employees), gauss_next is not None, budget_iterations, stagnant], dtype=numpy.int64)
+    sections = [numpy.array([gauss_next or 0.0, seconds], dtype=numpy.float64).tobytes(),
+                numpy.array(words, dtype=numpy.uint32).tobytes(),
+                encode_sequences(graph.sequences),
+                encode_sequences(search.best_sequences),
+                tabu.tobytes(),
+                fingerprints.tobytes(),
+                config,
+                employees]
+    write_atomically(path, [MAGIC, header.tobytes(), *padded(sections)])
+
+def load_checkpoint(path) -> Checkpoint:
+    data = pathlib.Path(path).read_bytes()
+    if len(data) < HEADER or data[:len(MAGIC)] != MAGIC:
+        raise InstanceError(f"{path} is not a checkpoint")
+    num_nodes, digest, num_employees, iteration, best_time, num_tabu, num_fingerprints, config_length, employees_length, has_gauss, \
+        budget_iterations, stagnant = (int(v) for v in numpy.frombuffer(data, dtype=numpy.int64, count=12, offset=len(MAGIC)))
+    offset = HEADER
+
+    def take(dtype, count):
+        nonlocal offset
+        size = numpy.dtype(dtype).itemsize * count
+        if offset + size > len(data):
+            raise InstanceError(f"{path} is truncated")
+        section = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += size + -size % 8
+        return section
+
+    gauss_next, seconds = take(numpy.float64, 2).tolist()
+    words = tuple(take(numpy.uint32, RNG_WORDS).tolist())
+    sequence_length = num_employees + num_nodes
+    sequences = decode_sequences(take(numpy.int32, sequence_length).tobytes(), num_employees)
+    best_sequences = decode_sequences(take(numpy.int32, sequence_length).tobytes(), num_employees)
+    tabu = take(numpy.int64, 4 * num_tabu).reshape(-1, 4).tolist()
+    fingerprints = take(numpy.uint64, num_fingerprints).tolist()
+    config = TabuConfig.from_json(take(numpy.uint8, config_length).tobytes().decode())
+    names = take(numpy.uint8, employees_length).tobytes().decode()
+    return Checkpoint(num_nodes=num_nodes,
+                      digest=digest,
+                      employees=names.split("\0") if num_employees else [],
+                      config=config,
+                      iteration=iteration,
+                      best_time=best_time,
+                      sequences=sequences,
+                      best_sequences=best_sequences,
+                      tabu_until={(n, m, i): until for n, m, i, until in tabu},
+                      recent_fingerprints=fingerprints,
+                      rng_state=(3, words, gauss_next if has_gauss else None),
+                      budget_used=(budget_iterations, stagnant, seconds))
+
+# A TabuSearch on a new TabuGraph of compiled in the checkpointed state. Stepping
+# it makes exactly the moves the checkpointed search would have made, and its
+# next incumbents() only uses what is left of the checkpointed budget.
+def resume(path, compiled: CompiledGraph, instrumentation: Instrumentation = None) -> TabuSearch:
+    checkpoint = load_checkpoint(path)
+    if checkpoint.num_nodes != compiled.num_nodes or checkpoint.digest != graph_digest(compiled):
+        raise InstanceError(f"{path} is a checkpoint of a different instance")
+    graph = TabuGraph(compiled)
+    graph.load_sequences(checkpoint.sequences, checkpoint.employees)
+    search = TabuSearch(graph, checkpoint.config, instrumentation)
+    search.iteration = checkpoint.iteration
+    search.best_time = checkpoint.best_time
+    search.best_sequences = [array('i', s) for s in checkpoint.best_sequences]
+    search.tabu_until = checkpoint.tabu_until
+    search.recent_fingerprints = deque(checkpoint.recent_fingerprints)
+    search.recent_counts = Counter(checkpoint.recent_fingerprints)
+    search.rng.setstate(checkpoint.rng_state)
+    search.budget_used = checkpoint.budget_used
+    search.resumed = True
+    return search
+
+# on_step for TabuSearch.solve that saves a checkpoint every interval seconds
+class Checkpointer:
+    path: pathlib.Path
+    interval: float
+    saves: int
+    last: float # perf_counter of the last save
+
+    def __init__(self, path, interval=5.0):
+        self.path = pathlib.Path(path)
+        self.interval = interval
+        self.saves = 0
+        self.last = time.perf_counter()
+        self._compiled: Optional[CompiledGraph] = None
+        self._digest = None
+
+    def __call__(self, search: TabuSearch):
+        if time.perf_counter() - self.last >= self.interval:
+            self.save(search)
+
+    def save(self, search: TabuSearch):
+        # the digest reads the whole graph, only worth doing once
+        if self._compiled is not search.graph.compiled:
+            self._compiled = search.graph.compiled
+            self._digest = graph_digest(self._compiled)
+        save_checkpoint(self.path, search, self._digest)
+        self.saves += 1
+        self.last = time.perf_counter()
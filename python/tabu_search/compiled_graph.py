@@ -0,0 +1,144 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional
+import networkx
+import numpy
+from tabu_search.input_types import Operation
+
+# Operations interned to ids 0..n-1 with the task edges in CSR form:
+# the deps of operation i are dep_indices[dep_offsets[i]:dep_offsets[i + 1]],
+# and the operations that depend on i are the same slice of the dependent_* arrays
+@dataclass
+class CompiledGraph:
+    names: list[str] # id -> operation name
+    ids: dict[str, int] # operation name -> id
+    durations: numpy.ndarray # int64, id -> duration
+    dep_offsets: numpy.ndarray # int32, #nodes + 1
+    dep_indices: numpy.ndarray # int32, #edges
+    dependent_offsets: numpy.ndarray # int32, #nodes + 1
+    dependent_indices: numpy.ndarray # int32, #edges
+    jobs: numpy.ndarray # int32, id -> index into job_names
+    job_names: list[str]
+    # How long every employee takes for every operation, None if everyone takes
+    # durations. int64 #nodes x #employees, -1 where the employee can't do it.
+    processing_times: Optional[numpy.ndarray] = None
+    employee_names: Optional[list[str]] = None # column -> employee name
+
+    @property
+    def employee_ids(self):
+        return {e: c for c, e in enumerate(self.employee_names or [])}
+
+    @property
+    def num_nodes(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        return len(self.dep_indices)
+
+    def deps(self, i):
+        return self.dep_indices[self.dep_offsets[i]:self.dep_offsets[i + 1]]
+
+    def dependents(self, i):
+        return self.dependent_indices[self.dependent_offsets[i]:self.dependent_offsets[i + 1]]
+
+    # Operations nothing depends on
+    def sinks(self):
+        return numpy.flatnonzero(numpy.diff(self.dependent_offsets) == 0)
+
+    # The shortest any employee takes for every operation, what bounds and
+    # work estimates go by
+    def min_durations(self):
+        if self.processing_times is None:
+            return self.durations
+        return numpy.where(self.processing_times >= 0, self.processing_times, numpy.iinfo(numpy.int64).max).min(axis=1)
+
+    # Operation i back in input form, with the processing times it was compiled from
+    def operation(self, i):
+        processing_times = None
+        eligible = None
+        if self.processing_times is not None:
+            row = self.processing_times[i].tolist()
+            if min(row) < 0:
+                eligible = [e for e, d in zip(self.employee_names, row) if d >= 0]
+            processing_times = {e: d for e, d in zip(self.employee_names, row) if d >= 0 and d != self.durations[i]} or None
+        return Operation(self.names[i], int(self.durations[i]), [self.names[d] for d in self.deps(i).tolist()],
+                         self.job_names[self.jobs[i]], processing_times, eligible)
+
+# The processing time matrix for compile_edges. rows[i] is (duration, processing
+# times, eligible) of operation i, in Operation's terms.
+def processing_matrix(rows, employee_names: list[str]):
+    columns = {e: c for c, e in enumerate(employee_names)}
+    matrix = numpy.empty((len(rows), len(employee_names)), dtype=numpy.int64)
+    for i, (duration, processing_times, eligible) in enumerate(rows):
+        if eligible is None:
+            matrix[i] = duration
+        else:
+            matrix[i] = -1
+            matrix[i, [columns[e] for e in eligible]] = duration
+        for e, d in (processing_times or {}).items():
+            if eligible is None or e in eligible:
+                matrix[i, columns[e]] = d
+    return matrix
+
+# A processing time matrix row of an operation whose duration goes from
+# duration to new, in place. Every eligible employee keeps their time relative
+# to the duration, rounded, unless it was 0 and there's nothing to scale.
+def rescale_processing_times(row, duration, new):
+    eligible = row >= 0
+    if duration > 0:
+        row[eligible] = (row[eligible] * new + duration // 2) // duration
+    else:
+        row[eligible] = new
+
+# deps[i] is a list of the ids operation i depends on
+def compile_edges(names: list[str], durations, deps: list[list[int]], jobs: list[str], processing_times=None, employee_names=None):
+    job_names = list(dict.fromkeys(jobs))
+    job_ids = {j: i for i, j in enumerate(job_names)}
+    counts = numpy.fromiter((len(d) for d in deps), dtype=numpy.int32, count=len(deps))
+    dep_offsets = numpy.zeros(len(names) + 1, dtype=numpy.int32)
+    numpy.cumsum(counts, out=dep_offsets[1:])
+    dep_indices = numpy.fromiter((d for ds in deps for d in ds), dtype=numpy.int32, count=int(dep_offsets[-1]))
+
+    # the same edges grouped by their other end
+    sources = numpy.repeat(numpy.arange(len(names), dtype=numpy.int32), counts)
+    dependent_indices = sources[numpy.argsort(dep_indices, kind='stable')]
+    dependent_offsets = numpy.zeros(len(names) + 1, dtype=numpy.int32)
+    numpy.cumsum(numpy.bincount(dep_indices, minlength=len(names)), out=dependent_offsets[1:])
+
+    return CompiledGraph(names=names,
+                         ids={n: i for i, n in enumerate(names)},
+                         durations=numpy.asarray(durations, dtype=numpy.int64),
+                         dep_offsets=dep_offsets,
+                         dep_indices=dep_indices,
+                         dependent_offsets=dependent_offsets,
+                         dependent_indices=dependent_indices,
+                         jobs=numpy.fromiter((job_ids[j] for j in jobs), dtype=numpy.int32, count=len(jobs)),
+                         job_names=job_names,
+                         processing_times=processing_times,
+                         employee_names=employee_names)
+
+# employees are the columns of the processing time matrix, only needed if any
+# operation has processing_times or eligible
+def compile_operations(operations: list[Operation], employees: list[str] = None):
+    names = [o.name for o in operations]
+    ids = {n: i for i, n in enumerate(names)}
+    # repeated deps collapse into one edge, same as networkx did
+    deps = [[ids[d] for d in dict.fromkeys(o.deps)] for o in operations]
+    processing_times = None
+    if any(o.processing_times is not None or o.eligible is not None for o in operations):
+        if employees is None:
+            employees = list(dict.fromkeys(e for o in operations for e in (o.eligible or []) + list(o.processing_times or {})))
+        processing_times = processing_matrix([(o.duration, o.processing_times, o.eligible) for o in operations], employees)
+    return compile_edges(names, [o.duration for o in operations], deps, [o.job for o in operations],
+                         processing_times, list(employees) if processing_times is not None else None)
+
+# Graphs in the old layout: node -> dep edges with a 'duration' on every node
+def compile_networkx(g: networkx.DiGraph):
+    names = list(g.nodes)
+    ids = {n: i for i, n in enumerate(names)}
+    deps = [[ids[d] for d in g.successors(n)] for n in names]
+    return compile_edges(names,
+                         [g.nodes[n]['duration'] for n in names],
+                         deps,
+                         [g.nodes[n].get('job', "") for n in names])
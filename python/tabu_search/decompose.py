@@ -0,0 +1,165 @@
+from __future__ import annotations
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Optional
+import numpy
+from tabu_search.compiled_graph import CompiledGraph, compile_edges
+from tabu_search.sampling import best_random_sequences
+from tabu_search.search import Budget, TabuConfig, TabuSearch
+from tabu_search.types import TabuGraph
+
+@dataclass
+class DecomposeConfig:
+    # at most this many subproblems, defaults to one per employee
+    max_groups: Optional[int] = None
+    # keep every job's tasks in one subproblem even if they aren't connected
+    by_job: bool = True
+    # for every subproblem, then for the merged solution
+    budget: Budget = field(default_factory=lambda: Budget(iterations=200))
+    refine: Budget = field(default_factory=lambda: Budget(iterations=50))
+    tabu: TabuConfig = field(default_factory=TabuConfig)
+    # random solutions every subproblem starts from the best of
+    samples: int = 256
+    # process pool size, defaults to one worker per subproblem
+    workers: Optional[int] = None
+    seed: Optional[int] = None
+
+# Operation ids grouped into parts that share no task edges once the last task,
+# which waits on everything, is taken out. With by_job tasks of the same job
+# also stay together. Largest part first.
+def components(compiled: CompiledGraph, by_job=True):
+    n = compiled.num_nodes
+    last_task = int(compiled.sinks()[-1])
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    sources = numpy.repeat(numpy.arange(n), numpy.diff(compiled.dep_offsets)).tolist()
+    for a, b in zip(sources, compiled.dep_indices.tolist()):
+        if a != last_task:
+            union(a, b)
+    if by_job:
+        first_of_job = dict()
+        for x, j in enumerate(compiled.jobs.tolist()):
+            if x != last_task:
+                union(x, first_of_job.setdefault(j, x))
+
+    roots = numpy.fromiter((find(x) for x in range(n)), dtype=numpy.int64, count=n)
+    roots[last_task] = -1
+    order = numpy.argsort(roots, kind='stable')[1:]
+    _, starts = numpy.unique(roots[order], return_index=True)
+    parts = numpy.split(order, starts[1:])
+    durations = compiled.durations
+    return sorted(parts, key=lambda p: -int(durations[p].sum()))
+
+# Packs parts into at most max_groups groups of similar total work, largest
+# part into the lightest group first. Returns sorted operation id arrays.
+def group_parts(compiled: CompiledGraph, parts, max_groups):
+    durations = compiled.durations
+    heap = [(0, g, []) for g in range(min(max_groups, len(parts)))]
+    for part in parts:
+        work, g, members = heapq.heappop(heap)
+        members.append(part)
+        heapq.heappush(heap, (work + int(durations[part].sum()), g, members))
+    return [numpy.sort(numpy.concatenate(members)) for _, _, members in sorted(heap, key=lambda h: h[1])]
+
+# Employees per group, at least one each and the rest going to whichever group
+# has the most work per employee
+def split_employees(work, num_employees):
+    shares = [1] * len(work)
+    heap = [(-w, g) for g, w in enumerate(work)]
+    heapq.heapify(heap)
+    for _ in range(num_employees - len(work)):
+        _, g = heapq.heappop(heap)
+        shares[g] += 1
+        heapq.heappush(heap, (-work[g] / shares[g], g))
+    return shares
+
+# The subproblem on nodes: those tasks with their edges, and the last task with
+# no duration waiting on the ones nothing else in the group waits on, so it
+# still has one last task. The last task gets local id len(nodes). processing is
+# TabuGraph.processing restricted to the group's employees, named employees.
+def subgraph(compiled: CompiledGraph, nodes, processing=None, employees=None):
+    last_task = int(compiled.sinks()[-1])
+    local = numpy.full(compiled.num_nodes, -1, dtype=numpy.int64)
+    local[nodes] = numpy.arange(len(nodes))
+    deps = [local[compiled.deps(x)].tolist() for x in nodes.tolist()]
+    waited_on = numpy.zeros(len(nodes), dtype=bool)
+    for d in deps:
+        waited_on[d] = True
+    deps.append(numpy.flatnonzero(~waited_on).tolist())
+    names = [compiled.names[x] for x in nodes.tolist()] + [compiled.names[last_task]]
+    durations = numpy.append(compiled.durations[nodes], 0)
+    jobs = [compiled.job_names[j] for j in compiled.jobs[nodes].tolist()] + [compiled.job_names[compiled.jobs[last_task]]]
+    if processing is not None:
+        processing = numpy.vstack([processing[nodes], numpy.zeros((1, processing.shape[1]), dtype=numpy.int64)])
+    return compile_edges(names, durations, deps, jobs, processing, employees if processing is not None else None)
+
+# Solves one subproblem in a worker, returns its sequences in local ids without the last task
+def _solve_part(sub: CompiledGraph, num_employees, samples, budget: Budget, tabu: TabuConfig):
+    graph = TabuGraph(sub)
+    _, sequences = best_random_sequences(sub, num_employees, samples, rng=numpy.random.default_rng(tabu.seed))[0]
+    graph.load_sequences(sequences, sub.employee_names or [str(m) for m in range(num_employees)])
+    search = TabuSearch(graph, tabu)
+    search.solve(budget)
+    end = sub.num_nodes - 1
+    return [[x for x in s if x != end] for s in search.best_sequences]
+
+# Splits the instance into loosely coupled groups, solves every group on its own
+# share of the employees in a process pool, puts the partial schedules side by
+# side with the last task after them and refines the result with a short tabu
+# search over the whole instance. Returns (assignments, makespan).
+#
+# Groups get consecutive employees. With processing times, if that leaves some
+# task without an employee of its group that can do it, everything is solved
+# as one group instead.
+def solve_decomposed(compiled: CompiledGraph, employees: list[str], config: DecomposeConfig = None):
+    config = config if config is not None else DecomposeConfig()
+    num_employees = len(employees)
+    last_task = int(compiled.sinks()[-1])
+    graph = TabuGraph(compiled)
+    graph.set_employees(employees)
+    parts = components(compiled, config.by_job)
+    groups = group_parts(compiled, parts, min(config.max_groups or num_employees, num_employees)) if parts else []
+    shares = split_employees([int(compiled.durations[g].sum()) for g in groups], num_employees)
+    bounds = numpy.cumsum([0] + shares)
+    processing = graph.processing
+    if processing is not None and not all((processing[g, bounds[i]:bounds[i + 1]] >= 0).any(axis=1).all() for i, g in enumerate(groups)):
+        groups = [numpy.sort(numpy.concatenate(groups))] if groups else []
+        shares = [num_employees]
+        bounds = [0, num_employees]
+
+    sequences = []
+    with ProcessPoolExecutor(max_workers=config.workers or max(len(groups), 1)) as pool:
+        futures = []
+        for i, (nodes, share) in enumerate(zip(groups, shares)):
+            tabu = replace(config.tabu, seed=None if config.seed is None else config.seed * 1000003 + i)
+            sub = subgraph(compiled, nodes, None if processing is None else processing[:, bounds[i]:bounds[i + 1]], employees[bounds[i]:bounds[i + 1]])
+            futures.append(pool.submit(_solve_part, sub, share, config.samples, config.budget, tabu))
+        for nodes, future in zip(groups, futures):
+            sequences += [nodes[s].tolist() for s in future.result()]
+    sequences += [[] for _ in range(num_employees - len(sequences))]
+
+    # the last task goes after whichever employee that can do it is done first,
+    # nothing waits on it so where it is doesn't change anyone else's finish
+    machines = graph.eligible[last_task] if graph.eligible is not None and graph.eligible[last_task] is not None else range(num_employees)
+    graph.load_sequences([s + [last_task] if m == machines[0] else s for m, s in enumerate(sequences)])
+    graph._ensure_schedule()
+    finish = graph.finish
+    m = min(machines, key=lambda m: finish[sequences[m][-1]] if sequences[m] else 0)
+    sequences[m].append(last_task)
+    graph.load_sequences(sequences)
+
+    search = TabuSearch(graph, replace(config.tabu, seed=config.seed))
+    search.solve(config.refine)
+    return search.best_assignments(), search.best_time
@@ -1,29 +1,55 @@
 import json
+import contextlib
 import copy
 import time
-from input_types import *
+from tabu_search.input_types import *
+from tabu_search.types import TabuGraph
+from tabu_search.loader import load_instance
+from tabu_search.instrumentation import NULL_INSTRUMENTATION, Instrumentation, JsonlSink, profiled
+from tabu_search.search import Budget, TabuConfig, TabuSearch
+from tabu_search.sampling import best_random_sequences
+from tabu_search.parallel import IslandConfig, solve_islands
+from tabu_search.replan import PlanDelta, replan
+from tabu_search.decompose import DecomposeConfig, solve_decomposed
+from tabu_search.checkpoint import Checkpointer, resume
 import argparse
 import pathlib
-import networkx
 import random
 from collections import deque
 
-# Runtime roughly O(#nodes)
+# Runtime O(#nodes + #edges)
+# Computes the finish time of every task in one topological pass over the task
+# edges plus the assignment order. Reads positions from the assignments themselves
+# so stale assignment pointers on the graph can't leak in.
+def finish_times(task_graph, assignments):
+    left_of = dict()
+    right_of = dict()
+    for tasks in assignments.values():
+        for left, right in zip(tasks, tasks[1:]):
+            left_of[right] = left
+            right_of[left] = right
+
+    waiting = {n: task_graph.out_degree(n) + (1 if n in left_of else 0) for n in task_graph.nodes}
+    ready = [n for n, c in waiting.items() if c == 0]
+    finish = dict()
+    while ready:
+        node = ready.pop()
+        waits_on = list(task_graph.successors(node))
+        if node in left_of:
+            waits_on.append(left_of[node])
+        finish[node] = task_graph.nodes[node]['duration'] + max((finish[w] for w in waits_on), default=0)
+        released = list(task_graph.predecessors(node))
+        if node in right_of:
+            released.append(right_of[node])
+        for r in released:
+            waiting[r] -= 1
+            if waiting[r] == 0:
+                ready.append(r)
+    return finish
+
 # Assignment pointer is a tuple (machine, index) that indexes into assignments
 def completion_time(task_graph, assignments, node):
-    data = task_graph.nodes[node]
-    assignment_pointer = data['assignment_pointer']
-    if assignment_pointer[1] == 0 and data['leaf']:
-        return data['duration']
-    # max of completion time by moving left in the assignment list ( current person working on previously assigned task )
-    # and the max completion time of the subtasks
-    goleft = completion_time(task_graph, assignments, assignments[assignment_pointer[0]][assignment_pointer[1] - 1]) \
-                 if assignment_pointer[1] > 0 else 0
-    childrencompletion = [completion_time(task_graph, assignments, c) for c in task_graph.successors(node)]
-    return data['duration'] + \
-                max(completion_time(task_graph, assignments, assignments[assignment_pointer[0]][assignment_pointer[1] - 1]) \
-                    if assignment_pointer[1] > 0 else 0,
-                    max([completion_time(task_graph, assignments, c) for c in task_graph.successors(node)] + [0]))
+    return finish_times(task_graph, assignments)[node]
 
 # We reduce the problem space a little bit by only assigning 
 # items in a valid order for O(n) cost
@@ -121,12 +147,11 @@ def get_valid_moves(task_graph, assignments):
     return moves
 
 # Applies the move to the graph and assignments, returns new assignments
-def apply_move(task_graph, assignments, move):
-    print(f"Applying: {move}")
+def apply_move(task_graph, assignments, move, instrumentation=NULL_INSTRUMENTATION):
+    instrumentation.count("applied")
     node_to_move = move[0]
     move = move[1]
     data = task_graph.nodes[node_to_move]
-    print(data)
     new_assignments = copy.deepcopy(assignments)
     # mark old position for deletion
     new_assignments[data['assignment_pointer'][0]][data['assignment_pointer'][1]] = None
@@ -136,16 +161,20 @@ def apply_move(task_graph, assignments, move):
     return new_assignments
 
 # randomly generate graphs until it looks reasonable
-def random_search(task_graph, operations, employees, last_task, iters):
+def random_search(task_graph, operations, employees, last_task, iters, instrumentation=NULL_INSTRUMENTATION):
     best_completion_time = None
     for i in range(0, iters):
-        assignments = generate_random_solution(task_graph, operations, employees)
-        print(assignments)
-        add_assignments_to_graph(task_graph, assignments)
-        newtime = completion_time(task_graph, assignments, last_task)
-        if not best_completion_time or newtime < best_completion_time:
+        with instrumentation.timer("generate"):
+            assignments = generate_random_solution(task_graph, operations, employees)
+        with instrumentation.timer("evaluate"):
+            add_assignments_to_graph(task_graph, assignments)
+            newtime = completion_time(task_graph, assignments, last_task)
+        improved = not best_completion_time or newtime < best_completion_time
+        if improved:
             best_completion_time = newtime
             best_assignment = assignments
+        instrumentation.count("improvements", improved)
+        instrumentation.end_iteration(iteration=i, time=newtime, best=best_completion_time)
     add_assignments_to_graph(task_graph, best_assignment)
     return best_assignment, best_completion_time
 
@@ -155,91 +184,131 @@ def random_search(task_graph, operations, employees, last_task, iters):
 # Wiki notation is that a "candidate" is a fully rendered set of assignments, not just a candidate _move_
 # please interpret below accordingly in place of types ( for now? TODO: mypy? ) 
 TABU_TENURE=10
-def tabu_search(task_graph, operations, employees, last_task, iters):
-    print("Beginning tabu search...")
+def tabu_search(task_graph, operations, employees, last_task, iters, instrumentation=NULL_INSTRUMENTATION):
     assignments = generate_random_solution(task_graph, operations, employees)
-    print("Initial assignments: ", assignments)
     add_assignments_to_graph(task_graph, assignments)
     add_transitive_dependencies_to_graph(task_graph, assignments)
     best_candidate = assignments 
     best_candidate_time = completion_time(task_graph, assignments, last_task)
     return_assignments = assignments
     return_time = best_candidate_time
-    print("Initial time: ", return_time)
 
     tabu_list = deque(maxlen=TABU_TENURE)
     tabu_list.append(assignments)
 
     for i in range(0, iters):
-        print(f"Best candidate: {best_candidate}")
-        neighborhood = get_valid_moves(task_graph, best_candidate)
-        print(neighborhood)
+        with instrumentation.timer("generate"):
+            neighborhood = get_valid_moves(task_graph, best_candidate)
+        instrumentation.count("neighbourhood", len(neighborhood))
         first = neighborhood.pop()
-        print("Using move: ", first)
-        print(assignments)
-        best_candidate = apply_move(task_graph, assignments, first)
-        add_assignments_to_graph(task_graph, assignments)
-        best_candidate_time = completion_time(task_graph, best_candidate, last_task)
-        print(f"New candidate: {best_candidate} takes time: {best_candidate_time}")
+        with instrumentation.timer("apply"):
+            best_candidate = apply_move(task_graph, assignments, first, instrumentation)
+            add_assignments_to_graph(task_graph, assignments)
+        with instrumentation.timer("evaluate"):
+            best_candidate_time = completion_time(task_graph, best_candidate, last_task)
+        instrumentation.count("evaluated")
 
         for neighbor in neighborhood:
-            print("Using move: ", neighbor)
-            print(assignments)
-            candidate = apply_move(task_graph, assignments, neighbor)
-            add_assignments_to_graph(task_graph, candidate)
-            print(f"Tabu list: {tabu_list}")
+            with instrumentation.timer("apply"):
+                candidate = apply_move(task_graph, assignments, neighbor, instrumentation)
+                add_assignments_to_graph(task_graph, candidate)
             if not candidate in tabu_list:
-                t = completion_time(task_graph, candidate, last_task)
-                print(f"New candidate: {candidate} takes time: {t}")
+                with instrumentation.timer("evaluate"):
+                    t = completion_time(task_graph, candidate, last_task)
+                instrumentation.count("evaluated")
                 if t < best_candidate_time:
                     best_candidate = candidate
                     best_candidate_time = t
             else:
-                print("That's taboo!")
+                instrumentation.count("tabu_hits")
             
-        if best_candidate_time < return_time:
+        improved = best_candidate_time < return_time
+        if improved:
             return_assignments = best_candidate
             return_time = best_candidate_time
-        print(f"Best so far: {return_time}")
+        instrumentation.count("improvements", improved)
+        instrumentation.end_iteration(iteration=i, time=best_candidate_time, best=return_time)
 
         tabu_list.append(best_candidate)
     return return_assignments, return_time
         
 
 def main(args):
-    f = open(args.filepath)
-    data = json.load(f)
-    operations = [Operation.from_dict(j) for j in data['operations']]
-    employees = [Employee.from_dict(dict({'id': i}, **e)) for i, e in enumerate(data['employees'])] 
+    instance = load_instance(args.filepath, args.cache_dir, use_cache=not args.no_cache)
+    employees = instance.employees
     num_employees = len(employees)
 
-    # build operations graph 
-    task_graph = networkx.DiGraph()
-    for operation in operations:
-        task_graph.add_node(operation.name, duration=operation.duration, leaf=(not operation.deps))
-    for operation in operations:
-        for dep in operation.deps:
-            task_graph.add_edge(operation.name, dep)
-
-    # Find the last task
-    last_task = None
-    for operation in operations:
-        if not any(task_graph.predecessors(operation.name)):
-            last_task = operation.name
+    iters = args.iterations if args.iterations is not None or args.seconds is not None or args.stagnation is not None else 100
+    budget = Budget(seconds=args.seconds, iterations=iters, stagnation=args.stagnation)
+    tabu = TabuConfig(tenure=args.tenure, sample_size=args.sample_size)
 
-    iters = 100
+    instrumentation = Instrumentation(JsonlSink(args.metrics)) if args.metrics else NULL_INSTRUMENTATION
+    if args.resume and args.checkpoint and args.checkpoint.exists():
+        search = resume(args.checkpoint, instance.compiled, instrumentation)
+        graph = search.graph
+        print(f"RESUMED at iteration {search.iteration} with completion time {search.best_time}")
+    else:
+        graph = TabuGraph(instance.compiled)
+        graph.set_employees(employees)
+        start = time.time()
+        best_completion_time, best_sequences = best_random_sequences(graph.compiled, num_employees, args.samples, processing=graph.processing)[0]
+        graph.load_sequences(best_sequences)
+        end = time.time()
+        print(f"RANDOM {args.samples} samples in {end - start} found assignment: {graph.assignments} with completion time {best_completion_time}")
+        search = TabuSearch(graph, tabu, instrumentation)
 
+    checkpointer = Checkpointer(args.checkpoint, args.checkpoint_every) if args.checkpoint else None
     start = time.time()
-    best_assignment, best_completion_time = random_search(task_graph, operations, employees, last_task, iters)
+    with profiled(args.profile) if args.profile else contextlib.nullcontext():
+        best = search.solve(budget, lambda i: print(f"INCUMBENT {i.makespan} after {i.seconds:.3f}s, iteration {i.iteration}, gap {i.gap:.1%}"),
+                            on_step=checkpointer)
     end = time.time()
-    print(f"RANDOM {iters} iters in {end - start} found assignment: {best_assignment} with completion time {best_completion_time}")
+    if checkpointer is not None:
+        checkpointer.save(search)
+    instrumentation.close()
+    print(f"TABU {search.iteration} iters in {end - start}, stopped on {search.stop_reason.value}, found assignment: {best.assignments} with completion time {best.makespan}, lower bound {best.lower_bound}")
+
+    if args.replan:
+        with open(args.replan) as f:
+            delta = PlanDelta.from_dict(json.load(f))
+        search.restore_best()
+        start = time.time()
+        graph, best = replan(graph, delta, budget, tabu)
+        end = time.time()
+        print(f"REPLAN in {end - start} found assignment: {best.assignments} with completion time {best.makespan}")
+
+    if args.islands:
+        start = time.time()
+        config = IslandConfig(islands=args.islands, epochs=args.epochs, iterations_per_epoch=iters or 100, tabu=tabu)
+        best_assignment, best_completion_time = solve_islands(instance.path or instance.compiled, employees, config)
+        end = time.time()
+        print(f"ISLANDS {args.islands}x{args.epochs}x{config.iterations_per_epoch} iters in {end - start} found assignment: {best_assignment} with completion time {best_completion_time}")
 
-    # start = time.time()
-    # best_assignment, best_completion_time = tabu_search(task_graph, operations, employees, last_task, iters)
-    # print(f"TABU {iters} iters in {end - start} found assignment: {best_assignment} with completion time {best_completion_time}")
-    # end = time.time()
+    if args.decompose:
+        start = time.time()
+        config = DecomposeConfig(budget=budget, tabu=tabu)
+        best_assignment, best_completion_time = solve_decomposed(instance.compiled, employees, config)
+        end = time.time()
+        print(f"DECOMPOSED in {end - start} found assignment: {best_assignment} with completion time {best_completion_time}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process input operations file")
     parser.add_argument('filepath', type=pathlib.Path)
+    parser.add_argument('--cache-dir', type=pathlib.Path, default=None, help="where compiled instances are kept, defaults to ~/.cache/tabu_search")
+    parser.add_argument('--no-cache', action='store_true', help="parse the input every time instead of going through the compiled cache")
+    parser.add_argument('--samples', type=int, default=1000, help="random solutions to draw for the tabu search to start from")
+    parser.add_argument('--seconds', type=float, default=None, help="wall clock budget for the tabu search")
+    parser.add_argument('--iterations', type=int, default=None, help="iteration budget for the tabu search, 100 if no budget is given")
+    parser.add_argument('--stagnation', type=int, default=None, help="stop after this many iterations without a new best")
+    parser.add_argument('--tenure', type=int, default=TABU_TENURE, help="iterations a task can't move back to where it just left")
+    parser.add_argument('--sample-size', type=int, default=None, help="score this many random moves per iteration instead of the whole neighbourhood")
+    parser.add_argument('--metrics', type=pathlib.Path, default=None, help="write per-iteration tabu search counters and timings here as JSON lines")
+    parser.add_argument('--profile', type=pathlib.Path, default=None, help="write cProfile stats of the tabu search here")
+    parser.add_argument('--islands', type=int, default=0, help="also run this many tabu searches in parallel, sharing their best solutions")
+    parser.add_argument('--epochs', type=int, default=10, help="how many times the islands share their best solutions")
+    parser.add_argument('--replan', type=pathlib.Path, default=None, help="JSON plan delta to apply to the tabu search's best and re-optimise from there")
+    parser.add_argument('--checkpoint', type=pathlib.Path, default=None, help="save the tabu search state here periodically and when it ends")
+    parser.add_argument('--checkpoint-every', type=float, default=5.0, help="seconds between checkpoints")
+    parser.add_argument('--resume', action='store_true', help="continue the tabu search from --checkpoint if it exists")
+    parser.add_argument('--decompose', action='store_true', help="also solve independent jobs separately in parallel, then refine the merged schedule")
     main(parser.parse_args())
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
-from typing import List
+from typing import Dict, List, Optional
 
 @dataclass_json
 @dataclass
@@ -10,6 +10,10 @@ class Operation:
     duration: int
     deps: List[str]
     job: str
+    # employee name -> how long it takes them, everyone else takes duration
+    processing_times: Optional[Dict[str, int]] = None
+    # the only employees that can do it, None for everyone
+    eligible: Optional[List[str]] = None
 
 @dataclass_json
 @dataclass
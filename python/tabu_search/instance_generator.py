@@ -0,0 +1,103 @@
+from __future__ import annotations
+import argparse
+import json
+import math
+import pathlib
+import random
+from tabu_search.input_types import Operation
+
+# Duration distributions, each a function of an rng returning a positive int
+def uniform_durations(low=1, high=9):
+    return lambda rng: rng.randint(low, high)
+
+def exponential_durations(mean=5):
+    return lambda rng: max(1, round(rng.expovariate(1 / mean)))
+
+# heavy tailed, a few tasks take far longer than the rest
+def lognormal_durations(median=5, sigma=1.0):
+    return lambda rng: max(1, round(rng.lognormvariate(math.log(median), sigma)))
+
+DURATIONS = {'uniform': uniform_durations, 'exponential': exponential_durations, 'lognormal': lognormal_durations}
+
+# "uniform:1:9" -> uniform_durations(1, 9)
+def parse_durations(spec):
+    kind, *params = spec.split(":")
+    return DURATIONS[kind](*(float(p) if "." in p else int(p) for p in params))
+
+# Everything nothing depends on feeds one zero length "end" task, the solver
+# wants a single last task
+def _finish(operations: list[Operation]):
+    depended_on = {d for o in operations for d in o.deps}
+    operations.append(Operation("end", 0, [o.name for o in operations if o.name not in depended_on], "end"))
+    return operations
+
+# num_operations tasks in layers of width, each depending on fan_in tasks of the layer below
+def layered(num_operations, width=10, fan_in=2, durations=uniform_durations(), rng=random):
+    operations = []
+    below = []
+    layer = []
+    for i in range(num_operations):
+        deps = rng.sample(below, min(fan_in, len(below)))
+        operations.append(Operation(f"t{i}", durations(rng), deps, "J0"))
+        layer.append(f"t{i}")
+        if len(layer) == width:
+            below, layer = layer, []
+    return _finish(operations)
+
+# Every task depends on up to fan_in tasks picked from the window before it,
+# the whole prefix if window is None
+def random_dag(num_operations, fan_in=2, window=None, durations=uniform_durations(), rng=random):
+    operations = []
+    for i in range(num_operations):
+        low = 0 if window is None else max(0, i - window)
+        deps = [f"t{d}" for d in rng.sample(range(low, i), min(fan_in, i - low))]
+        operations.append(Operation(f"t{i}", durations(rng), deps, "J0"))
+    return _finish(operations)
+
+# num_jobs independent random DAGs of num_operations // num_jobs tasks each,
+# every task depending on tasks of its own job only
+def multi_job(num_operations, num_jobs=10, fan_in=2, window=5, durations=uniform_durations(), rng=random):
+    operations = []
+    for j in range(num_jobs):
+        size = num_operations // num_jobs + (j < num_operations % num_jobs)
+        for i in range(size):
+            low = max(0, i - window)
+            deps = [f"j{j}_{d}" for d in rng.sample(range(low, i), min(fan_in, i - low))]
+            operations.append(Operation(f"j{j}_{i}", durations(rng), deps, f"J{j}"))
+    return _finish(operations)
+
+KINDS = {'layered': layered, 'random': random_dag, 'multi_job': multi_job}
+
+# The input file format, {'operations': [...], 'employees': [...]}
+def to_json(operations: list[Operation], num_employees):
+    return {'operations': [o.to_dict() for o in operations],
+            'employees': [{'name': f"e{i}"} for i in range(num_employees)]}
+
+def generate(kind, num_operations, fan_in=2, durations=uniform_durations(), seed=None, **kwargs):
+    return KINDS[kind](num_operations, fan_in=fan_in, durations=durations, rng=random.Random(seed), **kwargs)
+
+def main(args):
+    kwargs = {}
+    if args.width is not None:
+        kwargs['width'] = args.width
+    if args.window is not None:
+        kwargs['window'] = args.window
+    if args.jobs is not None:
+        kwargs['num_jobs'] = args.jobs
+    operations = generate(args.kind, args.operations, args.fan_in, parse_durations(args.durations), args.seed, **kwargs)
+    with open(args.output, "w") as f:
+        json.dump(to_json(operations, args.employees), f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic instance")
+    parser.add_argument('kind', choices=list(KINDS))
+    parser.add_argument('output', type=pathlib.Path)
+    parser.add_argument('--operations', type=int, default=1000)
+    parser.add_argument('--employees', type=int, default=5)
+    parser.add_argument('--fan-in', type=int, default=2, help="deps per task")
+    parser.add_argument('--durations', default="uniform:1:9", help="uniform:LOW:HIGH, exponential:MEAN or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--width', type=int, default=None, help="tasks per layer, layered only")
+    parser.add_argument('--window', type=int, default=None, help="how far back deps are picked from, random and multi_job only")
+    parser.add_argument('--jobs', type=int, default=None, help="number of jobs, multi_job only")
+    parser.add_argument('--seed', type=int, default=None)
+    main(parser.parse_args())
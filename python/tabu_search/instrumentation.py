@@ -0,0 +1,143 @@
+from __future__ import annotations
+import contextlib
+import cProfile
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+# Where per-iteration records go. A record is a flat dict of counters and
+# timings plus whatever the caller adds, e.g. the iteration and the best makespan.
+class Sink:
+    def emit(self, record: dict):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class NullSink(Sink):
+    def emit(self, record: dict):
+        pass
+
+class MemorySink(Sink):
+    records: list[dict]
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record: dict):
+        self.records.append(record)
+
+# One JSON object per line, to a path or an open file
+class JsonlSink(Sink):
+    def __init__(self, target):
+        self.owned = not hasattr(target, "write")
+        self.file = open(target, "w") if self.owned else target
+
+    def emit(self, record: dict):
+        self.file.write(json.dumps(record))
+        self.file.write("\n")
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+# Counters and timers for one solver run. Everything is a no-op when enabled
+# is False, callers in hot loops check enabled themselves and skip the calls.
+class Instrumentation:
+    enabled: bool
+    sink: Sink
+    counters: Counter # this iteration's counts, emitted and reset by end_iteration
+    timings: Counter # this iteration's seconds, same
+    totals: Counter # counts and seconds over the whole run
+
+    def __init__(self, sink: Sink = None, enabled=True):
+        self.sink = sink if sink is not None else NullSink()
+        self.enabled = enabled
+        self.counters = Counter()
+        self.timings = Counter()
+        self.totals = Counter()
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    # with instrumentation.timer("evaluate"): ...
+    def timer(self, name):
+        return self._timed(name) if self.enabled else contextlib.nullcontext()
+
+    # Emits this iteration's counters and timings with fields, then starts the next one
+    def end_iteration(self, **fields):
+        if not self.enabled:
+            return
+        record = dict(fields)
+        record.update(self.counters)
+        record.update((f"{name}_seconds", t) for name, t in self.timings.items())
+        self.sink.emit(record)
+        self.totals.update(self.counters)
+        self.totals.update({f"{name}_seconds": t for name, t in self.timings.items()})
+        self.counters.clear()
+        self.timings.clear()
+
+    def close(self):
+        self.sink.close()
+
+# Shared by everything that isn't given instrumentation of its own
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
+
+# Runs the block under cProfile and dumps the stats to path, for snakeviz or pstats
+@contextlib.contextmanager
+def profiled(path):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+# Samples the stack of the thread that started it every interval seconds from a
+# background thread. Much cheaper than cProfile on long runs, counts is
+# "file:line function" of the innermost frame -> times it was seen.
+class StackSampler:
+    interval: float
+    counts: Counter
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                code = frame.f_code
+                self.counts[f"{code.co_filename}:{frame.f_lineno} {code.co_name}"] += 1
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    # The n most seen locations as records, e.g. for a sink
+    def top(self, n=20):
+        total = sum(self.counts.values()) or 1
+        return [{'location': location, 'samples': c, 'share': c / total} for location, c in self.counts.most_common(n)]
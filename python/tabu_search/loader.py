@@ -0,0 +1,209 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+import numpy
+from tabu_search.compiled_graph import CompiledGraph, compile_edges, processing_matrix
+
+class InstanceError(ValueError):
+    pass
+
+# A validated instance: the compiled task graph and the employee names, plus the
+# binary file it lives in if it went through the cache
+@dataclass
+class Instance:
+    compiled: CompiledGraph
+    employees: list[str]
+    path: Optional[pathlib.Path] = None
+
+# Unknown deps, repeated names, cycles and anything other than one last task are
+# all errors, so nothing downstream has to check again
+def validate(compiled: CompiledGraph):
+    # Kahn's algorithm, plain lists beat numpy levels on long chains
+    offsets = compiled.dependent_offsets.tolist()
+    dependents = compiled.dependent_indices.tolist()
+    remaining = numpy.diff(compiled.dep_offsets).tolist()
+    ready = [n for n, r in enumerate(remaining) if r == 0]
+    reached = 0
+    while ready:
+        n = ready.pop()
+        reached += 1
+        for p in dependents[offsets[n]:offsets[n + 1]]:
+            remaining[p] -= 1
+            if remaining[p] == 0:
+                ready.append(p)
+    if reached < compiled.num_nodes:
+        # what it never reached is on a cycle or waits on one
+        names = [compiled.names[n] for n, r in enumerate(remaining) if r][:10]
+        raise InstanceError(f"task edges are circular, stuck tasks include {names}")
+    sinks = compiled.sinks()
+    if len(sinks) != 1:
+        raise InstanceError(f"expected exactly one last task, found {[compiled.names[n] for n in sinks[:10]]}")
+
+# processing_times and eligible, if any operation has them, must only name
+# employees of the instance, and every operation needs someone who can do it
+def _processing_times(operations, employees):
+    known = set(employees)
+    rows = []
+    for o in operations:
+        processing_times = o.get('processing_times')
+        eligible = o.get('eligible')
+        unknown = [e for e in (eligible or []) + list(processing_times or {}) if e not in known]
+        if unknown:
+            raise InstanceError(f"task {o['name']} names unknown employees {unknown[:10]}")
+        if eligible is not None and not eligible:
+            raise InstanceError(f"nobody can do task {o['name']}")
+        rows.append((o['duration'], processing_times, eligible))
+    return processing_matrix(rows, employees)
+
+# Compiles the parsed JSON input, {'operations': [...], 'employees': [...]}.
+# Reads the dicts directly, building Operation objects costs more than the rest
+# of the load put together.
+def compile_instance(data) -> Instance:
+    try:
+        operations = data['operations']
+        names = [o['name'] for o in operations]
+        ids = {n: i for i, n in enumerate(names)}
+        if len(ids) != len(names):
+            seen = set()
+            raise InstanceError(f"repeated task names {sorted({n for n in names if n in seen or seen.add(n)})[:10]}")
+        if any('\0' in n for n in names):
+            raise InstanceError("task names can't contain NUL")
+        deps = []
+        for o in operations:
+            try:
+                deps.append([ids[d] for d in dict.fromkeys(o['deps'])])
+            except KeyError as e:
+                raise InstanceError(f"task {o['name']} depends on unknown task {e.args[0]}") from None
+        employees = [e['name'] for e in data['employees']]
+        processing_times = None
+        if any(o.get('processing_times') is not None or o.get('eligible') is not None for o in operations):
+            processing_times = _processing_times(operations, employees)
+        compiled = compile_edges(names, [o['duration'] for o in operations], deps, [o['job'] for o in operations],
+                                 processing_times, employees if processing_times is not None else None)
+    except KeyError as e:
+        raise InstanceError(f"missing field {e.args[0]}") from None
+    validate(compiled)
+    return Instance(compiled=compiled, employees=employees)
+
+# Binary layout, every section starts 8 byte aligned:
+#   magic, then int64 #nodes, #edges, #jobs, #employees, the byte length of each
+#   name blob and #processing time columns, 0 without processing times
+#   durations int64, dep_offsets, dep_indices, dependent_offsets, dependent_indices, jobs int32
+#   processing times int64 #nodes x #columns, the columns are the employees
+#   task names, job names and employee names, each NUL separated utf-8
+MAGIC = b"TSGRAPH\x02"
+HEADER = len(MAGIC) + 8 * 8
+
+def _blob(strings):
+    return "\0".join(strings).encode()
+
+def _pad(n):
+    return -n % 8
+
+# Writes the chunks next to path and renames the result over it, so readers
+# never see half a file
+def write_atomically(path, chunks):
+    path = pathlib.Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+# Every section padded to 8 bytes
+def padded(sections):
+    for s in sections:
+        yield s
+        yield b"\0" * _pad(len(s))
+
+def save_compiled(path, instance: Instance):
+    compiled = instance.compiled
+    columns = 0
+    if compiled.processing_times is not None:
+        if list(compiled.employee_names) != list(instance.employees):
+            raise InstanceError("processing times need one column per employee, in order")
+        columns = len(instance.employees)
+    blobs = [_blob(compiled.names), _blob(compiled.job_names), _blob(instance.employees)]
+    header = numpy.array([compiled.num_nodes, compiled.num_edges, len(compiled.job_names), len(instance.employees)] + [len(b) for b in blobs] + [columns], dtype=numpy.int64)
+    sections = [numpy.asarray(compiled.durations, dtype=numpy.int64).tobytes()]
+    sections += [numpy.asarray(a, dtype=numpy.int32).tobytes() for a in (compiled.dep_offsets, compiled.dep_indices, compiled.dependent_offsets, compiled.dependent_indices, compiled.jobs)]
+    if columns:
+        sections.append(numpy.ascontiguousarray(compiled.processing_times, dtype=numpy.int64).tobytes())
+    sections += blobs
+    write_atomically(path, [MAGIC, header.tobytes(), *padded(sections)])
+
+# The arrays are views straight into the mapped file, nothing is copied until
+# it is touched. Only the names get decoded into Python strings.
+def load_compiled(path) -> Instance:
+    data = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+    if len(data) < HEADER or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise InstanceError(f"{path} is not a compiled graph")
+    num_nodes, num_edges, num_jobs, num_employees, *blob_lengths, columns = (int(v) for v in data[len(MAGIC):HEADER].view(numpy.int64))
+    offset = HEADER
+
+    def take(dtype, count):
+        nonlocal offset
+        size = numpy.dtype(dtype).itemsize * count
+        if offset + size > len(data):
+            raise InstanceError(f"{path} is truncated")
+        section = data[offset:offset + size].view(dtype).view(numpy.ndarray)
+        offset += size + _pad(size)
+        return section
+
+    def strings(length, count):
+        blob = bytes(take(numpy.uint8, length))
+        return blob.decode().split("\0") if count else []
+
+    durations = take(numpy.int64, num_nodes)
+    dep_offsets = take(numpy.int32, num_nodes + 1)
+    dep_indices = take(numpy.int32, num_edges)
+    dependent_offsets = take(numpy.int32, num_nodes + 1)
+    dependent_indices = take(numpy.int32, num_edges)
+    jobs = take(numpy.int32, num_nodes)
+    processing_times = take(numpy.int64, num_nodes * columns).reshape(num_nodes, columns) if columns else None
+    names = strings(blob_lengths[0], num_nodes)
+    job_names = strings(blob_lengths[1], num_jobs)
+    employees = strings(blob_lengths[2], num_employees)
+    compiled = CompiledGraph(names=names,
+                             ids=dict(zip(names, range(num_nodes))),
+                             durations=durations,
+                             dep_offsets=dep_offsets,
+                             dep_indices=dep_indices,
+                             dependent_offsets=dependent_offsets,
+                             dependent_indices=dependent_indices,
+                             jobs=jobs,
+                             job_names=job_names,
+                             processing_times=processing_times,
+                             employee_names=employees if columns else None)
+    return Instance(compiled=compiled, employees=employees, path=pathlib.Path(path))
+
+def default_cache_dir():
+    return pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache")) / "tabu_search"
+
+# Loads a JSON instance, going through a compiled copy in cache_dir keyed by the
+# hash of the file, so only the first run parses and validates it
+def load_instance(path, cache_dir=None, use_cache=True) -> Instance:
+    raw = pathlib.Path(path).read_bytes()
+    if not use_cache:
+        return compile_instance(json.loads(raw))
+    cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    cached = cache_dir / (hashlib.sha256(MAGIC + raw).hexdigest() + ".graph")
+    if cached.exists():
+        try:
+            return load_compiled(cached)
+        except (InstanceError, ValueError):
+            pass # truncated or from an old layout, rebuild it
+    instance = compile_instance(json.loads(raw))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    save_compiled(cached, instance)
+    instance.path = cached
+    return instance
@@ -0,0 +1,109 @@
+from __future__ import annotations
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Optional
+import numpy
+from tabu_search.compiled_graph import CompiledGraph
+from tabu_search.loader import load_compiled
+from tabu_search.search import TabuConfig, TabuSearch, random_sequences
+from tabu_search.types import TabuGraph
+
+# Assignments cross process boundaries as one int32 buffer: the length of every
+# employee's sequence, then all the operation ids back to back
+def encode_sequences(sequences) -> bytes:
+    lengths = numpy.fromiter((len(s) for s in sequences), dtype=numpy.int32, count=len(sequences))
+    return lengths.tobytes() + b"".join(numpy.asarray(s, dtype=numpy.int32).tobytes() for s in sequences)
+
+def decode_sequences(data: bytes, num_employees) -> list[list[int]]:
+    values = numpy.frombuffer(data, dtype=numpy.int32)
+    ends = numpy.cumsum(values[:num_employees])
+    return [s.tolist() for s in numpy.split(values[num_employees:], ends[:-1])]
+
+class IslandMode(Enum):
+    # every island keeps searching from where it left off, taking in better migrants
+    TABU = "tabu"
+    # every island starts each epoch from a new random solution
+    RESTART = "restart"
+
+@dataclass
+class IslandConfig:
+    islands: int = field(default_factory=lambda: os.cpu_count() or 1)
+    epochs: int = 10
+    iterations_per_epoch: int = 100
+    mode: IslandMode = IslandMode.TABU
+    tabu: TabuConfig = field(default_factory=TabuConfig)
+    # process pool size, defaults to one worker per island
+    workers: Optional[int] = None
+    seed: Optional[int] = None
+
+# Every worker process builds its TabuGraph once and reloads it per epoch
+_worker_graph: TabuGraph = None
+_worker_employees: list[str] = None
+
+# graph is either a CompiledGraph, pickled over to every worker, or the path of
+# a compiled graph file, which every worker maps for itself
+def _init_worker(graph, employees: list[str]):
+    global _worker_graph, _worker_employees
+    compiled = graph if isinstance(graph, CompiledGraph) else load_compiled(graph).compiled
+    _worker_graph = TabuGraph(compiled)
+    _worker_graph.set_employees(employees)
+    _worker_employees = employees
+
+# One epoch of one island, returns (best encoding, best makespan, current encoding)
+def _run_epoch(start: Optional[bytes], iterations, tabu: TabuConfig):
+    graph = _worker_graph
+    num_employees = len(_worker_employees)
+    if start is None:
+        graph.load_sequences(random_sequences(graph, num_employees, random.Random(tabu.seed)))
+    else:
+        graph.load_sequences(decode_sequences(start, num_employees))
+    search = TabuSearch(graph, tabu)
+    search.run(iterations)
+    return encode_sequences(search.best_sequences), search.best_time, encode_sequences(graph.sequences)
+
+def _seed(config: IslandConfig, island, epoch):
+    if config.seed is None:
+        return None
+    return (config.seed * 1000003 + island) * 1000003 + epoch
+
+# Runs config.islands searches in a process pool for config.epochs epochs. After
+# every epoch each island's best migrates to the next island in a ring, which
+# starts from it if it beats its own best. Returns the global best as
+# (assignments, makespan). compiled can also be a path from save_compiled.
+def solve_islands(compiled, employees: list[str], config: IslandConfig = None):
+    config = config if config is not None else IslandConfig()
+    names = (compiled if isinstance(compiled, CompiledGraph) else load_compiled(compiled).compiled).names
+    num_employees = len(employees)
+    current = [None] * config.islands
+    best = [(None, None)] * config.islands
+    global_best = (None, None)
+    with ProcessPoolExecutor(max_workers=config.workers or config.islands,
+                             initializer=_init_worker,
+                             initargs=(compiled, employees)) as pool:
+        for epoch in range(config.epochs):
+            futures = []
+            for island in range(config.islands):
+                tabu = replace(config.tabu, seed=_seed(config, island, epoch))
+                start = None if config.mode == IslandMode.RESTART else current[island]
+                futures.append(pool.submit(_run_epoch, start, config.iterations_per_epoch, tabu))
+            for island, future in enumerate(futures):
+                encoded_best, best_time, current[island] = future.result()
+                if best[island][1] is None or best_time < best[island][1]:
+                    best[island] = (encoded_best, best_time)
+                if global_best[1] is None or best_time < global_best[1]:
+                    global_best = (encoded_best, best_time)
+
+            if config.mode == IslandMode.TABU and config.islands > 1:
+                migrants = list(best)
+                for island in range(config.islands):
+                    encoded, t = migrants[island - 1]
+                    if t < best[island][1]:
+                        best[island] = (encoded, t)
+                        current[island] = encoded
+
+    encoded, best_time = global_best
+    sequences = decode_sequences(encoded, num_employees)
+    return {e: [names[n] for n in s] for e, s in zip(employees, sequences)}, best_time
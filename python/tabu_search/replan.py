@@ -0,0 +1,194 @@
+from __future__ import annotations
+import bisect
+import math
+from typing import Dict, List
+from dataclasses import dataclass, field
+import numpy
+from dataclasses_json import dataclass_json
+from tabu_search.input_types import Operation
+from tabu_search.compiled_graph import compile_edges, processing_matrix, rescale_processing_times
+from tabu_search.loader import InstanceError, validate
+from tabu_search.search import Budget, TabuConfig, TabuSearch
+from tabu_search.types import TabuGraph
+
+# What changed in the plan since the graph's assignments were made
+@dataclass_json
+@dataclass
+class PlanDelta:
+    # deps are names of kept or other added operations. Anything nothing waits on
+    # is made a dep of the last task, so there is still one.
+    added: List[Operation] = field(default_factory=list)
+    # tasks that waited on a removed one wait on what it waited on instead
+    removed: List[str] = field(default_factory=list)
+    durations: Dict[str, int] = field(default_factory=dict) # name -> new duration, processing times scale with it
+    # Added employees can do the tasks anyone can, in their duration, unless
+    # added operations say otherwise
+    added_employees: List[str] = field(default_factory=list)
+    # their tasks go to whoever has the least work
+    removed_employees: List[str] = field(default_factory=list)
+
+    @property
+    def structural(self):
+        return bool(self.added or self.removed)
+
+# The compiled graph with the delta's operations added and removed, as
+# (names, durations, deps, jobs, processing times, employee names) for compile_edges
+def _rebuild_edges(graph: TabuGraph, delta: PlanDelta):
+    compiled = graph.compiled
+    removed = {compiled.ids[name] for name in delta.removed}
+    if graph.last_task_id in removed:
+        raise InstanceError("can't remove the last task")
+
+    # removed deps are replaced by their own deps, recursively
+    resolved = dict()
+    def resolve(d):
+        if d not in removed:
+            return [d]
+        if d not in resolved:
+            resolved[d] = [r for dd in compiled.deps(d).tolist() for r in resolve(dd)]
+        return resolved[d]
+
+    kept = [n for n in range(compiled.num_nodes) if n not in removed]
+    names = [compiled.names[n] for n in kept]
+    durations = [int(compiled.durations[n]) for n in kept]
+    jobs = [compiled.job_names[compiled.jobs[n]] for n in kept]
+    old_deps = [list(dict.fromkeys(r for d in compiled.deps(n).tolist() for r in resolve(d))) for n in kept]
+    names += [o.name for o in delta.added]
+    durations += [o.duration for o in delta.added]
+    jobs += [o.job for o in delta.added]
+
+    ids = {name: i for i, name in enumerate(names)}
+    if len(ids) != len(names):
+        raise InstanceError("added operations repeat existing names")
+    new_id = {n: i for i, n in enumerate(kept)}
+    deps = [[new_id[d] for d in ds] for ds in old_deps]
+    for o in delta.added:
+        try:
+            deps.append([ids[d] for d in dict.fromkeys(o.deps)])
+        except KeyError as e:
+            raise InstanceError(f"task {o.name} depends on unknown task {e.args[0]}") from None
+    waited_on = {d for o in delta.added for d in o.deps}
+    last_task = new_id[graph.last_task_id]
+    deps[last_task] += [ids[o.name] for o in delta.added if o.name not in waited_on]
+    nominal = list(durations)
+    for name, d in delta.durations.items():
+        durations[ids[name]] = d
+
+    processing, columns = None, None
+    if compiled.processing_times is not None or any(o.processing_times is not None or o.eligible is not None for o in delta.added):
+        # kept tasks keep their processing times, anyone new can do them if everyone could
+        columns = list(dict.fromkeys(list(compiled.employee_names or []) + graph.employees + delta.added_employees
+                                     + [e for o in delta.added for e in (o.eligible or []) + list(o.processing_times or {})]))
+        old = compiled.processing_times
+        if old is None:
+            old = numpy.empty((compiled.num_nodes, 0), dtype=numpy.int64)
+        unrestricted = numpy.where((old >= 0).all(axis=1), compiled.durations, -1)[kept]
+        processing = numpy.column_stack([old[kept]] + [unrestricted] * (len(columns) - old.shape[1]))
+        processing = numpy.vstack([processing, processing_matrix([(o.duration, o.processing_times, o.eligible) for o in delta.added], columns)])
+        for name, d in delta.durations.items():
+            rescale_processing_times(processing[ids[name]], nominal[ids[name]], d)
+    return names, durations, deps, jobs, processing, columns
+
+# Repairs the graph's assignments into valid ones for the changed plan, without
+# searching. Returns the graph to keep using, the same one unless operations
+# were added or removed. The repair is worked out on a separate graph, so a
+# delta that gets rejected leaves graph as it was.
+#
+# Every kept sequence stays sorted by the old topological order, and new and
+# orphaned tasks are slotted in by a key above everything they wait on, so
+# every sequence stays sorted by one order consistent with all the task edges
+# and no task can end up waiting on itself.
+def apply_delta(graph: TabuGraph, delta: PlanDelta) -> TabuGraph:
+    compiled = graph.compiled
+    removed_employees = set(delta.removed_employees)
+    employees = [e for e in graph.employees if e not in removed_employees] + list(delta.added_employees)
+    if not employees:
+        raise InstanceError("no employees left")
+    removed = set(delta.removed)
+    added = {o.name for o in delta.added}
+    unknown = sorted(name for name in removed | set(delta.durations) if name not in compiled.ids and name not in added)
+    if unknown:
+        raise InstanceError(f"delta names unknown tasks {unknown[:10]}")
+    gone = sorted(removed & set(delta.durations))
+    if gone:
+        raise InstanceError(f"delta changes the durations of removed tasks {gone[:10]}")
+    if not delta.structural and not removed_employees and not delta.added_employees:
+        graph.set_durations({compiled.ids[name]: d for name, d in delta.durations.items()})
+        return graph
+
+    position = graph.topological_position
+    names = compiled.names
+    key = dict()
+    for n in range(compiled.num_nodes):
+        key[names[n]] = (math.inf, 0) if n == graph.last_task_id else (position[n], 0)
+    # added operations go right after the latest thing they wait on, in the order given
+    pending = {o.name: o for o in delta.added}
+    counter = 0
+    while pending:
+        progressed = False
+        for name, o in list(pending.items()):
+            if all(d in key for d in o.deps):
+                counter += 1
+                key[name] = (max((key[d][0] for d in o.deps), default=-1), counter)
+                del pending[name]
+                progressed = True
+        if not progressed:
+            raise InstanceError(f"added operations wait on unknown or circular deps {sorted(pending)[:10]}")
+
+    if delta.structural:
+        repaired = TabuGraph(compile_edges(*_rebuild_edges(graph, delta)))
+        validate(repaired.compiled)
+    else:
+        durations = {compiled.ids[name]: d for name, d in delta.durations.items()}
+        # copies the durations it changes, graph's stay as they are
+        repaired = TabuGraph(compiled)
+        repaired.set_durations(durations)
+    repaired.set_employees(employees)
+    ids = repaired.compiled.ids
+    if repaired.processing is not None:
+        processing = repaired.processing
+        duration_on = lambda t, m: int(processing[ids[t], m])
+    else:
+        new_durations = repaired.compiled.durations
+        duration_on = lambda t, m: int(new_durations[ids[t]])
+
+    sequences = []
+    orphans = [o.name for o in delta.added]
+    for e, sequence in zip(graph.employees, graph.sequences):
+        tasks = [names[n] for n in sequence if names[n] not in removed]
+        if e in removed_employees:
+            orphans += tasks
+        else:
+            sequences.append(tasks)
+    sequences += [[] for _ in delta.added_employees]
+
+    load = [sum(duration_on(t, m) for t in s) for m, s in enumerate(sequences)]
+    sequence_keys = [[key[t] for t in s] for s in sequences]
+    for t in sorted(orphans, key=key.__getitem__):
+        machines = [m for m in range(len(sequences)) if duration_on(t, m) >= 0]
+        if not machines:
+            raise InstanceError(f"nobody left can do task {t}")
+        m = min(machines, key=load.__getitem__)
+        i = bisect.bisect(sequence_keys[m], key[t])
+        sequences[m].insert(i, t)
+        sequence_keys[m].insert(i, key[t])
+        load[m] += duration_on(t, m)
+
+    assignments = dict(zip(employees, sequences))
+    repaired.update_assignments(assignments)
+    if delta.structural:
+        return repaired
+    # it all worked out, now the same on graph
+    graph.set_durations(durations)
+    graph.update_assignments(assignments)
+    return graph
+
+# Repairs the assignments for the delta and searches from there for a short
+# budget. Returns (graph, best incumbent) with the best assignments loaded on
+# the graph.
+def replan(graph: TabuGraph, delta: PlanDelta, budget: Budget = None, tabu: TabuConfig = None):
+    graph = apply_delta(graph, delta)
+    search = TabuSearch(graph, tabu if tabu is not None else TabuConfig())
+    best = search.solve(budget if budget is not None else Budget(iterations=50))
+    search.restore_best()
+    return graph, best
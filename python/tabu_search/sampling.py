@@ -0,0 +1,114 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import numpy
+from tabu_search.compiled_graph import CompiledGraph
+
+# The CSR neighbours of every node in nodes, back to back, and where each node's run starts
+def _gather(offsets, indices, nodes):
+    starts = offsets[nodes]
+    lengths = offsets[nodes + 1] - starts
+    total = int(lengths.sum())
+    run_starts = numpy.zeros(len(nodes), dtype=numpy.int64)
+    numpy.cumsum(lengths[:-1], out=run_starts[1:])
+    positions = numpy.arange(total) - numpy.repeat(run_starts - starts, lengths)
+    return indices[positions], run_starts
+
+# Nodes grouped by the length of the longest dep chain below them, so every
+# group only depends on earlier groups
+def levels(compiled: CompiledGraph):
+    remaining = numpy.diff(compiled.dep_offsets).astype(numpy.int64)
+    frontier = numpy.flatnonzero(remaining == 0)
+    groups = []
+    while len(frontier):
+        groups.append(frontier)
+        dependents, _ = _gather(compiled.dependent_offsets, compiled.dependent_indices, frontier)
+        touched, counts = numpy.unique(dependents, return_counts=True)
+        remaining[touched] -= counts
+        frontier = touched[remaining[touched] == 0]
+    return groups
+
+@dataclass
+class SampleBatch:
+    orders: numpy.ndarray # (batch, #nodes) operation ids in the order they get scheduled
+    machines: numpy.ndarray # (batch, #nodes) operation id -> employee index
+    makespans: numpy.ndarray # (batch,)
+
+    # Sample b as one list of operation ids per employee, for TabuGraph.load_sequences
+    def sequences(self, b, num_employees):
+        order = self.orders[b]
+        machine = self.machines[b][order]
+        return [order[machine == m].tolist() for m in range(num_employees)]
+
+# batch_size random valid assignments and their makespans at once.
+# Every sample gets a random topological order, from random keys pushed up the
+# levels so a node's key is always above its deps', and a random employee per
+# task. Employees work their tasks in that order, so the makespan is one pass
+# over the order with every step vectorised across the batch.
+# processing is TabuGraph.processing for the employees sampled for, tasks only
+# go to employees that can do them and take as long as it says there. Defaults
+# to the compiled processing times when they have a column per employee.
+def sample_batch(compiled: CompiledGraph, num_employees, batch_size, rng: numpy.random.Generator = None, processing=None):
+    rng = rng if rng is not None else numpy.random.default_rng()
+    n = compiled.num_nodes
+    if processing is None and compiled.processing_times is not None:
+        if compiled.processing_times.shape[1] != num_employees:
+            raise ValueError("processing times are for a different number of employees")
+        processing = compiled.processing_times
+    keys = rng.random((batch_size, n))
+    for group in levels(compiled)[1:]:
+        deps, run_starts = _gather(compiled.dep_offsets, compiled.dep_indices, group)
+        keys[:, group] += numpy.maximum.reduceat(keys[:, deps], run_starts, axis=1)
+    orders = numpy.argsort(keys, axis=1).astype(numpy.int32)
+    if processing is None:
+        machines = rng.integers(0, num_employees, (batch_size, n), dtype=numpy.int32)
+    else:
+        # a random pick among every task's employees, the ones that can do it sorted first
+        allowed = processing >= 0
+        columns = numpy.argsort(~allowed, axis=1, kind='stable').astype(numpy.int32)
+        picks = rng.integers(0, allowed.sum(axis=1), (batch_size, n))
+        machines = columns[numpy.arange(n), picks]
+
+    # every node also depends on column n, which stays 0, so no dep run is empty
+    dep_counts = numpy.diff(compiled.dep_offsets).astype(numpy.int64) + 1
+    offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(dep_counts, out=offsets[1:])
+    indices = numpy.insert(compiled.dep_indices.astype(numpy.int64), compiled.dep_offsets[:-1], n)
+
+    rows = numpy.arange(batch_size)
+    finish = numpy.zeros((batch_size, n + 1), dtype=numpy.int64)
+    free = numpy.zeros((batch_size, num_employees), dtype=numpy.int64)
+    durations = compiled.durations
+    for k in range(n):
+        x = orders[:, k]
+        m = machines[rows, x]
+        deps, run_starts = _gather(offsets, indices, x)
+        ready = numpy.maximum.reduceat(finish[numpy.repeat(rows, dep_counts[x]), deps], run_starts)
+        start = numpy.maximum(ready, free[rows, m])
+        done = start + (durations[x] if processing is None else processing[x, m])
+        finish[rows, x] = done
+        free[rows, m] = done
+
+    # the makespan is when the last task finishes, same as TabuGraph.completion_time
+    last_task = compiled.sinks()[-1]
+    return SampleBatch(orders=orders, machines=machines, makespans=finish[:, last_task])
+
+# Bytes sample_batch holds at once per sample and task: keys, their argsort,
+# orders, machines and finish times
+SAMPLE_BYTES_PER_TASK = 40
+# best_random_sequences draws batches of at most this many bytes
+SAMPLE_MEMORY = 256 << 20
+
+# The k best of batch_size random samples as (makespan, sequences), best first.
+# Drawn chunk_size at a time, by default as many as fit in SAMPLE_MEMORY, so
+# memory stays bounded however many samples are asked for.
+def best_random_sequences(compiled: CompiledGraph, num_employees, batch_size, k=1, rng: numpy.random.Generator = None, processing=None, chunk_size=None):
+    rng = rng if rng is not None else numpy.random.default_rng()
+    if chunk_size is None:
+        chunk_size = max(1, SAMPLE_MEMORY // (SAMPLE_BYTES_PER_TASK * max(1, compiled.num_nodes)))
+    best = [] # (makespan, sample number, sequences)
+    for first in range(0, batch_size, chunk_size):
+        batch = sample_batch(compiled, num_employees, min(chunk_size, batch_size - first), rng, processing)
+        for b in numpy.argsort(batch.makespans, kind='stable')[:k]:
+            best.append((int(batch.makespans[b]), first + int(b), batch.sequences(b, num_employees)))
+        best = sorted(best, key=lambda sample: sample[:2])[:k]
+    return [(makespan, sequences) for makespan, _, sequences in best]
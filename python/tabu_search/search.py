@@ -0,0 +1,368 @@
+from __future__ import annotations
+import heapq
+import random
+import threading
+import time
+from collections import deque, Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+from dataclasses_json import dataclass_json
+from tabu_search.bounds import gap
+from tabu_search.instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from tabu_search.types import Neighbourhood, TabuGraph
+
+# Candidates screened between checks of the deadline and cancel in a step
+INTERRUPT_CHECK = 64
+
+class TabuRule(Enum):
+    # the (task, employee, position) a task just left can't be moved back into
+    ATTRIBUTE = "attribute"
+    # a move can't go back to any of the last tenure assignments, by fingerprint
+    FINGERPRINT = "fingerprint"
+
+@dataclass_json
+@dataclass
+class TabuConfig:
+    tenure: int = 10
+    neighbourhood: Neighbourhood = Neighbourhood.N7
+    # score only this many randomly sampled moves per iteration, None scores all of them
+    sample_size: Optional[int] = None
+    # moves are screened with the O(#deps) estimate_move and only this many with
+    # the best estimates get the exact evaluate_move, None evaluates all of them
+    evaluate_top: Optional[int] = 10
+    tabu_rule: TabuRule = TabuRule.ATTRIBUTE
+    # tabu moves are still taken if they beat the best makespan found so far
+    aspiration: bool = True
+    seed: Optional[int] = None
+
+# When to stop, whichever limit is hit first. A step that runs out of time, or
+# gets cancelled, stops scoring moves and takes the best one it has so far.
+@dataclass
+class Budget:
+    seconds: Optional[float] = None
+    iterations: Optional[int] = None
+    # iterations in a row without a new best
+    stagnation: Optional[int] = None
+
+class StopReason(Enum):
+    SECONDS = "seconds"
+    ITERATIONS = "iterations"
+    STAGNATION = "stagnation"
+    CANCELLED = "cancelled"
+    # the best makespan hit the lower bound, nothing can beat it
+    OPTIMAL = "optimal"
+
+# A best solution as it is found. sequences is shared with the search, don't modify it.
+@dataclass
+class Incumbent:
+    makespan: int
+    iteration: int
+    seconds: float # since the search was started
+    sequences: list
+    employees: list[str]
+    names: list[str]
+    lower_bound: int
+
+    @property
+    def gap(self):
+        return gap(self.makespan, self.lower_bound)
+
+    @property
+    def assignments(self):
+        return {e: [self.names[n] for n in s] for e, s in zip(self.employees, self.sequences)}
+
+# A random assignment that respects the task edges: every task goes to a random
+# employee that can do it after everything it depends on. Eligibility comes from
+# graph.set_employees. Runtime O(#nodes + #edges).
+def random_sequences(graph: TabuGraph, num_employees, rng=random):
+    machines = graph.eligible if graph.eligible is not None and len(graph.employees) == num_employees else None
+    compiled = graph.compiled
+    unpicked_deps = [int(d) for d in compiled.dep_offsets[1:] - compiled.dep_offsets[:-1]]
+    eligible = [n for n, d in enumerate(unpicked_deps) if d == 0]
+    sequences = [[] for _ in range(num_employees)]
+    while eligible:
+        # swap the pick to the end so removing it is O(1)
+        i = rng.randrange(len(eligible))
+        eligible[i], eligible[-1] = eligible[-1], eligible[i]
+        n = eligible.pop()
+        if machines is not None and machines[n] is not None:
+            sequences[rng.choice(machines[n])].append(n)
+        else:
+            sequences[rng.randrange(num_employees)].append(n)
+        for p in compiled.dependents(n):
+            unpicked_deps[p] -= 1
+            if unpicked_deps[p] == 0:
+                eligible.append(int(p))
+    return sequences
+
+def random_assignments(graph: TabuGraph, employees: list[str], rng=random):
+    graph.set_employees(employees)
+    names = graph.compiled.names
+    return {e: [names[n] for n in s] for e, s in zip(employees, random_sequences(graph, len(employees), rng))}
+
+# Tabu search over a TabuGraph that already has assignments. Every iteration
+# screens the neighbourhood with estimate_move, scores the most promising moves
+# with evaluate_move, applies the best admissible move in place and remembers
+# what it undid, nothing is copied except when the best solution improves.
+class TabuSearch:
+    graph: TabuGraph
+    config: TabuConfig
+    iteration: int
+    best_sequences: list # copy of graph.sequences when best_time was found
+    best_time: int
+    tabu_until: dict[tuple[int, int, int], int] # (task, machine, position) -> first iteration it is allowed again
+    recent_fingerprints: deque # the last tenure fingerprints, oldest first
+    recent_counts: Counter # fingerprint -> times it is in recent_fingerprints
+    instrumentation: Instrumentation
+    stop_reason: Optional[StopReason] # why the last incumbents() or solve() ended
+    lower_bound: int # no assignment finishes sooner, see bounds.py
+    deadline: Optional[float] # perf_counter when the running incumbents() runs out of time
+    cancel: Optional[threading.Event] # of the running incumbents()
+    # how much of its budget the running or last incumbents() used, as
+    # (iterations, iterations without a new best, seconds)
+    budget_used: tuple[int, int, float]
+    resumed: bool # the next incumbents() carries on from budget_used rather than starting over
+
+    def __init__(self, graph: TabuGraph, config: TabuConfig = None, instrumentation: Instrumentation = None):
+        self.graph = graph
+        self.config = config if config is not None else TabuConfig()
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.rng = random.Random(self.config.seed)
+        self.iteration = 0
+        self.best_sequences = graph.copy_sequences()
+        self.best_time = graph.completion_time()
+        self.tabu_until = dict()
+        self.recent_fingerprints = deque()
+        self.recent_counts = Counter()
+        self.stop_reason = None
+        self.lower_bound = graph.lower_bounds().value
+        self.deadline = None
+        self.cancel = None
+        self.budget_used = (0, 0, 0.0)
+        self.resumed = False
+        self._remember(graph.fingerprint)
+
+    def _remember(self, fingerprint):
+        self.recent_fingerprints.append(fingerprint)
+        self.recent_counts[fingerprint] += 1
+        if len(self.recent_fingerprints) > self.config.tenure:
+            old = self.recent_fingerprints.popleft()
+            self.recent_counts[old] -= 1
+            if not self.recent_counts[old]:
+                del self.recent_counts[old]
+
+    # where the task ends up, with the index into its new employee's sequence after the move
+    @staticmethod
+    def _destination(move):
+        n, (remove, add) = move
+        if add[0] == remove[0] and add[1] > remove[1]:
+            return (n, add[0], add[1] - 1)
+        return (n, add[0], add[1])
+
+    def _is_tabu(self, move):
+        if self.config.tabu_rule == TabuRule.FINGERPRINT:
+            return self.graph._move_fingerprint(*move) in self.recent_counts
+        return self.tabu_until.get(self._destination(move), 0) > self.iteration
+
+    def _candidates(self):
+        if self.config.sample_size is not None:
+            return self.graph._sample_moves(self.config.neighbourhood, self.config.sample_size, self.rng)
+        return self.graph._iter_moves(self.config.neighbourhood)
+
+    # Whether the step should stop scoring moves
+    def _interrupted(self):
+        return (self.cancel is not None and self.cancel.is_set()) or \
+            (self.deadline is not None and time.perf_counter() >= self.deadline)
+
+    # Best admissible move as (makespan after it, move), ties broken at random.
+    # None if the neighbourhood is empty. Once interrupted, the best of the moves
+    # looked at so far.
+    def _choose(self):
+        instrumentation = self.instrumentation
+        if instrumentation.enabled:
+            # generated up front so generating and scoring get timed apart
+            with instrumentation.timer("generate"):
+                candidates = list(self._candidates())
+            instrumentation.count("neighbourhood", len(candidates))
+        else:
+            candidates = self._candidates()
+
+        graph = self.graph
+        lower_bound = self.lower_bound
+        chosen = None
+        chosen_time = None
+        ties = 0
+        fallback = None
+        evaluated = 0
+        tabu_hits = 0
+        pruned = 0
+        evaluate_top = self.config.evaluate_top
+        with instrumentation.timer("evaluate"):
+            admissible = []
+            estimates = []
+            for i, move in enumerate(candidates):
+                if i % INTERRUPT_CHECK == INTERRUPT_CHECK - 1 and self._interrupted():
+                    # of whatever got screened, only the best one
+                    evaluate_top = 1
+                    break
+                if fallback is None:
+                    fallback = move
+                tabu = self._is_tabu(move)
+                tabu_hits += tabu
+                if tabu and not self.config.aspiration:
+                    continue
+                # a tabu move has to beat the best ever to be taken
+                if tabu and graph._move_load_bound(*move) >= self.best_time:
+                    pruned += 1
+                    continue
+                if self.config.evaluate_top is not None:
+                    # index breaks ties in estimates, so the order never depends on comparing moves
+                    estimates.append((graph._estimate_move(*move), len(admissible)))
+                admissible.append((move, tabu))
+            estimated = len(estimates)
+            if estimates and len(admissible) > evaluate_top:
+                admissible = [admissible[i] for _, i in heapq.nsmallest(evaluate_top, estimates)]
+            for move, tabu in admissible:
+                if chosen is not None and self._interrupted():
+                    break
+                # skip scoring moves that can't beat the best so far this iteration
+                if chosen_time is not None and graph._move_load_bound(*move) > chosen_time:
+                    pruned += 1
+                    continue
+                t = graph._evaluate_move(*move)
+                evaluated += 1
+                if tabu and t >= self.best_time:
+                    continue
+                if chosen_time is None or t < chosen_time:
+                    chosen, chosen_time, ties = move, t, 1
+                    if t <= lower_bound:
+                        break # optimal, nothing else can do better
+                elif t == chosen_time:
+                    ties += 1
+                    if self.rng.randrange(ties) == 0:
+                        chosen = move
+            if chosen is None and fallback is not None:
+                # everything is tabu, take a step anyway rather than stall
+                chosen, chosen_time = fallback, self.graph._evaluate_move(*fallback)
+                evaluated += 1
+        if instrumentation.enabled:
+            instrumentation.count("estimated", estimated)
+            instrumentation.count("evaluated", evaluated)
+            instrumentation.count("tabu_hits", tabu_hits)
+            instrumentation.count("pruned", pruned)
+        return None if chosen is None else (chosen_time, chosen)
+
+    # One iteration. Returns True if it found a new best.
+    def step(self):
+        improved = self._step()
+        if self.instrumentation.enabled:
+            self.instrumentation.count("improvements", improved)
+            self.instrumentation.end_iteration(iteration=self.iteration, best=self.best_time)
+        return improved
+
+    def _step(self):
+        choice = self._choose()
+        self.iteration += 1
+        if choice is None:
+            return False
+        _, move = choice
+        n, (remove, _) = move
+        with self.instrumentation.timer("apply"):
+            self.graph._apply_move(n, move[1])
+        if self.config.tabu_rule == TabuRule.FINGERPRINT:
+            self._remember(self.graph.fingerprint)
+        else:
+            self.tabu_until[(n, remove[0], remove[1])] = self.iteration + self.config.tenure
+            if len(self.tabu_until) > 4 * self.config.tenure:
+                self.tabu_until = {k: v for k, v in self.tabu_until.items() if v > self.iteration}
+
+        t = self.graph.completion_time()
+        if t < self.best_time:
+            self.best_time = t
+            self.best_sequences = self.graph.copy_sequences()
+            return True
+        return False
+
+    # Stops early if the best hits the lower bound
+    def run(self, iterations):
+        for _ in range(iterations):
+            if self.best_time <= self.lower_bound:
+                break
+            self.step()
+        return self.best_assignments(), self.best_time
+
+    @property
+    def gap(self):
+        return gap(self.best_time, self.lower_bound)
+
+    def _incumbent(self, started):
+        return Incumbent(makespan=self.best_time,
+                         iteration=self.iteration,
+                         seconds=time.perf_counter() - started,
+                         sequences=self.best_sequences,
+                         employees=self.graph.employees,
+                         names=self.graph.compiled.names,
+                         lower_bound=self.lower_bound)
+
+    def _stop_reason(self, budget: Budget, started, iterations, stagnant, cancel):
+        if self.best_time <= self.lower_bound:
+            return StopReason.OPTIMAL
+        if cancel is not None and cancel.is_set():
+            return StopReason.CANCELLED
+        if budget.iterations is not None and iterations >= budget.iterations:
+            return StopReason.ITERATIONS
+        if budget.stagnation is not None and stagnant >= budget.stagnation:
+            return StopReason.STAGNATION
+        if budget.seconds is not None and time.perf_counter() - started >= budget.seconds:
+            return StopReason.SECONDS
+        return None
+
+    # Searches until the budget runs out or cancel is set from another thread,
+    # yielding the starting solution and then every new best as it is found.
+    # The caller can stop consuming at any point and keep the last one.
+    # on_step(search) is called after every iteration, e.g. to checkpoint.
+    # A search that was resumed from a checkpoint finishes the budget it was
+    # checkpointed with instead of starting a new one.
+    def incumbents(self, budget: Budget, cancel: threading.Event = None, on_step=None):
+        iterations, stagnant, seconds = self.budget_used if self.resumed else (0, 0, 0.0)
+        self.resumed = False
+        started = time.perf_counter() - seconds
+        self.budget_used = (iterations, stagnant, seconds)
+        self.stop_reason = None
+        yield self._incumbent(started)
+        self.deadline = None if budget.seconds is None else started + budget.seconds
+        self.cancel = cancel
+        try:
+            while True:
+                self.stop_reason = self._stop_reason(budget, started, iterations, stagnant, cancel)
+                if self.stop_reason is not None:
+                    return
+                iterations += 1
+                improved = self.step()
+                stagnant = 0 if improved else stagnant + 1
+                self.budget_used = (iterations, stagnant, time.perf_counter() - started)
+                if on_step is not None:
+                    on_step(self)
+                if improved:
+                    yield self._incumbent(started)
+        finally:
+            self.deadline = None
+            self.cancel = None
+
+    # incumbents() with on_improvement(incumbent) called for every new best,
+    # returns the best incumbent
+    def solve(self, budget: Budget, on_improvement=None, cancel: threading.Event = None, on_step=None):
+        best = None
+        for best in self.incumbents(budget, cancel, on_step):
+            if on_improvement is not None:
+                on_improvement(best)
+        return best
+
+    def best_assignments(self):
+        names = self.graph.compiled.names
+        return {e: [names[n] for n in s] for e, s in zip(self.graph.employees, self.best_sequences)}
+
+    # Put the best solution found back on the graph
+    def restore_best(self):
+        self.graph.load_sequences(self.best_sequences)
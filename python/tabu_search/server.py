@@ -0,0 +1,246 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import pathlib
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+import numpy
+from tabu_search.loader import compile_instance
+from tabu_search.sampling import best_random_sequences
+from tabu_search.search import Budget, TabuConfig, TabuSearch
+from tabu_search.types import TabuGraph
+
+# A long lived solver: requests come in as JSON lines, from stdin or a Unix
+# socket, and are solved in a process pool that stays warm between them.
+#
+# Request: {"id": ..., "instance": {"operations": [...], "employees": [...]}}
+#   or {"id": ..., "path": "instance.json"}, optionally with
+#   "budget": {"seconds", "iterations", "stagnation"}, which needs seconds or
+#   iterations, "samples": random solutions to start from and "tabu": TabuConfig
+#   fields, enums by value.
+# Response, in the order they finish: {"id": ..., "makespan", "lower_bound",
+#   "gap", "stop_reason", "iterations", "seconds", "assignments", "cached"}
+#   or {"id": ..., "error": "..."}.
+
+@dataclass
+class ServerConfig:
+    # process pool size, defaults to one per CPU
+    workers: Optional[int] = None
+    # compiled instances every worker keeps, least recently used goes first
+    graphs: int = 16
+    # answers kept for resubmissions of the same instance with the same settings
+    solutions: int = 1024
+
+# Least recently used goes when there are more than size items
+class LRU:
+    size: int
+    items: OrderedDict
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def pop(self, key):
+        self.items.pop(key, None)
+
+    def __len__(self):
+        return len(self.items)
+
+# Every worker compiles an instance the first time it sees its hash
+_worker_graphs: LRU = None
+# Set by SolverServer.close(), stops every search running or still to start
+_worker_cancel = None
+
+def _init_worker(graphs, cancel):
+    global _worker_graphs, _worker_cancel
+    _worker_graphs = LRU(graphs)
+    _worker_cancel = cancel
+
+def _solve(key, raw: bytes, budget: Budget, samples, tabu: TabuConfig):
+    start = time.perf_counter()
+    instance = _worker_graphs.get(key)
+    if instance is None:
+        instance = compile_instance(json.loads(raw))
+        _worker_graphs.put(key, instance)
+    graph = TabuGraph(instance.compiled)
+    graph.set_employees(instance.employees)
+    _, sequences = best_random_sequences(graph.compiled, len(instance.employees), samples,
+                                         rng=numpy.random.default_rng(tabu.seed), processing=graph.processing)[0]
+    graph.load_sequences(sequences)
+    search = TabuSearch(graph, tabu)
+    best = search.solve(budget, cancel=_worker_cancel)
+    return {'makespan': int(best.makespan),
+            'lower_bound': int(best.lower_bound),
+            'gap': best.gap,
+            'stop_reason': search.stop_reason.value,
+            'iterations': search.iteration,
+            'seconds': time.perf_counter() - start,
+            'assignments': best.assignments}
+
+# (instance hash, solution key, arguments for _solve) for a request. Instances
+# hash by their bytes, canonical JSON for inline ones, so the same file or
+# object always lands on the same cached graph and solution.
+def parse_request(request: dict):
+    if 'instance' in request:
+        raw = json.dumps(request['instance'], sort_keys=True, separators=(",", ":")).encode()
+    elif 'path' in request:
+        raw = pathlib.Path(request['path']).read_bytes()
+    else:
+        raise ValueError("request needs an instance or a path")
+    budget = Budget(**request.get('budget', {'iterations': 100}))
+    if budget.seconds is None and budget.iterations is None:
+        raise ValueError("budget needs seconds or iterations")
+    samples = int(request.get('samples', 256))
+    tabu = TabuConfig.from_dict(request.get('tabu', {}))
+    key = hashlib.sha256(raw).hexdigest()
+    settings = json.dumps({'budget': asdict(budget), 'samples': samples, 'tabu': request.get('tabu', {})}, sort_keys=True)
+    solution_key = hashlib.sha256((key + settings).encode()).hexdigest()
+    return key, solution_key, (raw, budget, samples, tabu)
+
+class SolverServer:
+    config: ServerConfig
+    pool: ProcessPoolExecutor
+    solutions: LRU # solution key -> Future of the _solve result, shared by identical requests in flight
+
+    def __init__(self, config: ServerConfig = None):
+        self.config = config if config is not None else ServerConfig()
+        self.cancel = multiprocessing.Event()
+        self.pool = ProcessPoolExecutor(max_workers=self.config.workers or os.cpu_count() or 1,
+                                        initializer=_init_worker, initargs=(self.config.graphs, self.cancel))
+        self.solutions = LRU(self.config.solutions)
+        self.lock = threading.Lock()
+
+    # (Future of the result, whether it came from the solution cache)
+    def submit(self, request: dict):
+        key, solution_key, args = parse_request(request)
+        with self.lock:
+            future = self.solutions.get(solution_key)
+            if future is not None:
+                return future, True
+            future = self.pool.submit(_solve, key, *args)
+            self.solutions.put(solution_key, future)
+        future.add_done_callback(lambda f: self._forget_failure(solution_key, f))
+        return future, False
+
+    # failures aren't cached, a resubmission tries again
+    def _forget_failure(self, solution_key, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            return
+        with self.lock:
+            if self.solutions.items.get(solution_key) is future:
+                self.solutions.pop(solution_key)
+
+    # Answers every request line with write(response) as soon as it is solved,
+    # returns once all of them are answered. write is called from pool threads
+    # but never concurrently. If write raises, e.g. the client went away, the
+    # rest of the responses are dropped and serve raises the same once the
+    # requests already submitted are done.
+    def serve(self, lines, write):
+        write_lock = threading.Lock()
+        answered = []
+        failed = [] # what write raised
+
+        def respond(response, done):
+            try:
+                with write_lock:
+                    if not failed:
+                        write(response)
+            except Exception as e:
+                failed.append(e)
+            finally:
+                done.set()
+
+        for line in lines:
+            if failed:
+                break
+            if not line.strip():
+                continue
+            done = threading.Event()
+            answered.append(done)
+            request = None
+            try:
+                request = json.loads(line)
+                future, cached = self.submit(request)
+            except Exception as e:
+                respond({'id': request.get('id') if isinstance(request, dict) else None, 'error': str(e)}, done)
+                continue
+
+            def finished(f, id=request.get('id'), cached=cached, done=done):
+                if f.cancelled():
+                    respond({'id': id, 'error': "server closed before it started"}, done)
+                elif f.exception() is not None:
+                    respond({'id': id, 'error': str(f.exception())}, done)
+                else:
+                    respond(dict({'id': id}, cached=cached, **f.result()), done)
+            future.add_done_callback(finished)
+        for done in answered:
+            done.wait()
+        if failed:
+            raise failed[0]
+
+    # Stops the searches still running, they answer with what they have so far,
+    # and drops the ones that haven't started
+    def close(self):
+        self.cancel.set()
+        self.pool.shutdown(cancel_futures=True)
+
+def _line_writer(file):
+    def write(response):
+        file.write(json.dumps(response) + "\n")
+        file.flush()
+    return write
+
+# One connection is one serve() call, any number of connections at once
+def serve_socket(server: SolverServer, path):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            wfile = self.wfile
+
+            def write(response):
+                wfile.write((json.dumps(response) + "\n").encode())
+                wfile.flush()
+            server.serve((line.decode() for line in self.rfile), write)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(str(path), Handler) as listener:
+        listener.serve_forever()
+
+def main(args):
+    server = SolverServer(ServerConfig(workers=args.workers, graphs=args.graphs, solutions=args.solutions))
+    try:
+        if args.socket:
+            serve_socket(server, args.socket)
+        else:
+            server.serve(sys.stdin, _line_writer(sys.stdout))
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve instances sent as JSON lines on stdin or a Unix socket")
+    parser.add_argument('--socket', type=pathlib.Path, default=None, help="listen on this Unix socket instead of stdin")
+    parser.add_argument('--workers', type=int, default=None, help="solver processes, defaults to one per CPU")
+    parser.add_argument('--graphs', type=int, default=16, help="compiled instances every worker keeps")
+    parser.add_argument('--solutions', type=int, default=1024, help="answers kept for identical resubmissions")
+    main(parser.parse_args())
@@ -1,128 +1,897 @@
-import networkx
+import heapq
+import random
+from array import array
+from dataclasses import replace
+from enum import Enum
+import numpy
 from tabu_search.input_types import Operation
+from tabu_search.compiled_graph import CompiledGraph, compile_networkx, compile_operations, rescale_processing_times
+from tabu_search.bounds import lower_bounds
 
+# Which moves get_valid_moves, iter_moves and sample_moves offer
+class Neighbourhood(Enum):
+    ALL = "all" # every task to every position it can go
+    # Only tasks on the critical path, in the style of the job shop neighbourhoods:
+    # N5 swaps the first two and last two tasks of each critical block, N7 moves
+    # tasks of a block to its start or end and its first and last task inside it.
+    # Both also offer moving critical tasks to any other employee.
+    N5 = "n5"
+    N7 = "n7"
+
+# Everything inside runs on operation ids from the compiled graph and employee
+# indices, the public methods take and return operation and employee names.
 class TabuGraph:
-    graph: networkx.DiGraph
-    assignment_pointers: dict[str, tuple[str, int]] # "A" -> ('Frank': 0)
-    assignments: dict[str, list[str]] # {'John': ["B"], 'Frank': ["A", "C"]}
-    assignment_aware_transitive_deps: dict[str, list[str]] # {"A": ["B", "C"]}, etc.
+    compiled: CompiledGraph
     last_task: str
+    employees: list[str] # machine index -> employee name
+    employee_ids: dict[str, int] # employee name -> machine index
+    # Only for compiled graphs with processing times, None otherwise. Filled by set_employees.
+    processing: numpy.ndarray # int64 operation id x machine index -> its duration there, -1 if it can't go there
+    eligible: list # operation id -> machine indices it can go to, None if any
+    sequences: list[array] # machine index -> operation ids in the order they are worked on
+    machine_of: array # operation id -> machine index
+    position_of: array # operation id -> index into its machine's sequence
+    machine_load: array # machine index -> total duration of its sequence
+    # Every node's bit is its id, a set of nodes is an int with their bits set
+    transitive_dep_bits: list[int] # operation id -> bits of everything it transitively waits on
+    # Every operation id after everything it waits on, kept valid across moves
+    topological_order: array
+    topological_position: array # operation id -> index into topological_order
+    # Cached schedule, filled by update_schedule(), patched by moves and dropped when the assignments are replaced
+    start: array # operation id -> earliest start
+    finish: array # operation id -> earliest finish
+    # Filled by update_tails() and dropped by moves, only estimates need it
+    tail: array # operation id -> longest path from its start to the end of the schedule
+    fingerprint: int # hash of the assignments, kept up to date across moves
+    bounds: dict # number of employees -> LowerBounds
+
+    def __init__(self, g):
+        self.compiled = g if isinstance(g, CompiledGraph) else compile_networkx(g)
+        n = self.compiled.num_nodes
+        # memoryviews index about as fast as lists without copying the arrays
+        self._dep_offsets = self.compiled.dep_offsets.data
+        self._dep_indices = self.compiled.dep_indices.data
+        self._dependent_offsets = self.compiled.dependent_offsets.data
+        self._dependent_indices = self.compiled.dependent_indices.data
+        # with processing times a task's duration depends on its machine, then
+        # this is a copy holding the duration where every task currently is
+        self._durations = self.compiled.durations.data
+        self._shared_durations = self.compiled.durations
+        self._processing = None
+        self.processing = None
+        self.eligible = None
+        self.employees = []
+        self.employee_ids = dict()
+        self.sequences = []
+        self.machine_of = array('i', [0]) * n
+        self.position_of = array('i', [0]) * n
+        self.transitive_dep_bits = [0] * n
+        self.topological_order = array('i', range(n))
+        self.topological_position = array('i', range(n))
+        self.start = array('q', [0]) * n
+        self.finish = array('q', [0]) * n
+        self.tail = array('q', [0]) * n
+        self.schedule_valid = False
+        self.tails_valid = False
+        self.fingerprint = 0
+        self.machine_load = array('q')
+        self.bounds = dict()
+        sinks = self.compiled.sinks()
+        assert(len(sinks))
+        self.last_task_id = int(sinks[-1])
+        self.last_task = self.compiled.names[self.last_task_id]
+
+    # {'John': ["B"], 'Frank': ["A", "C"]}
+    @property
+    def assignments(self):
+        names = self.compiled.names
+        return {e: [names[n] for n in s] for e, s in zip(self.employees, self.sequences)}
+
+    # "A" -> ('Frank': 0)
+    @property
+    def assignment_pointers(self):
+        return {name: (self.employees[self.machine_of[n]], self.position_of[n]) for n, name in enumerate(self.compiled.names)}
+
+    def bits_to_nodes(self, bits):
+        nodes = set()
+        while bits:
+            low = bits & -bits
+            nodes.add(self.compiled.names[low.bit_length() - 1])
+            bits ^= low
+        return nodes
 
-    def __init__(self, g: networkx.DiGraph):
-        self.assignment_pointers = dict()
-        self.assignments = dict()
-        self.assignment_aware_transitive_deps = dict()
-        self.graph = g
-        for node in self.graph.nodes:
-            if not any(self.graph.predecessors(node)):
-                    self.last_task = node
-        assert(self.last_task)
-
-    def update_assignment_aware_transitive_dependencies(self, node):
-        data = self.graph.nodes[node]
-        assignment_pointer = self.assignment_pointers[node]
-        if assignment_pointer[1] == 0 and data['leaf']:
-            return set()
-        # my dependencies are my task children + anything left of me in my individual assignment list
-        deps = set()
-        if assignment_pointer[1] > 0:
-            left_of_me = self.assignments[assignment_pointer[0]][assignment_pointer[1] - 1]
-            deps = set(left_of_me)
-            deps = deps.union(self.update_assignment_aware_transitive_dependencies(left_of_me))
-        for c in self.graph.successors(node):
-            deps.add(c)
-            deps = deps.union(self.update_assignment_aware_transitive_dependencies(c))
-        return deps
+    # {"A": {"B", "C"}}, etc. Decoded from the bitsets on every access, use
+    # transitive_dep_bits in anything hot
+    @property
+    def assignment_aware_transitive_deps(self):
+        return {name: self.bits_to_nodes(self.transitive_dep_bits[n]) for n, name in enumerate(self.compiled.names)}
 
+    # "A" -> earliest start
+    @property
+    def start_times(self):
+        self._ensure_schedule()
+        return dict(zip(self.compiled.names, self.start))
+
+    # "A" -> earliest finish
+    @property
+    def finish_times(self):
+        self._ensure_schedule()
+        return dict(zip(self.compiled.names, self.finish))
+
+    def _node_transitive_dep_bits(self, n):
+        bits = 0
+        for w in self._waits_on(n):
+            bits |= self.transitive_dep_bits[w] | (1 << w)
+        return bits
+
+    # Runtime O(#nodes + #edges) set unions, each O(#nodes / 64)
     def update_transitive_deps(self):
-        for n in self.graph.nodes:
-            self.assignment_aware_transitive_deps[n] = self.update_assignment_aware_transitive_dependencies(n)
+        for n in self.topological_order:
+            self.transitive_dep_bits[n] = self._node_transitive_dep_bits(n)
 
     def update_assignments(self, new_assignments):
-        self.assignments = new_assignments
-        self.assignment_pointers.clear()
-        self.assignment_aware_transitive_deps.clear()
-        for employee, assignment_list in self.assignments.items():
-            for i, assignment in enumerate(assignment_list):
-                self.assignment_pointers[assignment] = (employee, i)
+        ids = self.compiled.ids
+        self.load_sequences([[ids[t] for t in tasks] for tasks in new_assignments.values()], list(new_assignments))
+
+    # Machine index -> employee name, and with processing times which machine
+    # every task can go to and how long it takes there. Employees the compiled
+    # graph has no column for can do the tasks anyone can, in their duration.
+    # Runtime O(#nodes * #employees)
+    def set_employees(self, employees):
+        self.employees = list(employees)
+        self.employee_ids = {e: m for m, e in enumerate(self.employees)}
+        times = self.compiled.processing_times
+        if times is None:
+            return
+        columns = self.compiled.employee_ids
+        unrestricted = numpy.where((times >= 0).all(axis=1), self.compiled.durations, -1)
+        self.processing = numpy.empty((self.compiled.num_nodes, len(self.employees)), dtype=numpy.int64)
+        for m, e in enumerate(self.employees):
+            self.processing[:, m] = times[:, columns[e]] if e in columns else unrestricted
+        self._processing = self.processing.data
+        allowed = self.processing >= 0
+        restricted = numpy.flatnonzero(~allowed.all(axis=1)).tolist()
+        self.eligible = [None] * self.compiled.num_nodes
+        for n in restricted:
+            self.eligible[n] = numpy.flatnonzero(allowed[n]).tolist()
+        self._durations = array('q', self.compiled.durations)
 
+    # How long n takes on machine m
+    def _duration_on(self, n, m):
+        return self._durations[n] if self._processing is None else self._processing[n, m]
+
+    # Same as update_assignments for operation ids, one sequence per employee.
+    # Keeps the current employees unless new ones are given.
+    def load_sequences(self, sequences, employees=None):
+        if employees is not None or (self.compiled.processing_times is not None and self.processing is None):
+            self.set_employees(employees if employees is not None else self.employees)
+        self.sequences = [array('i', sequence) for sequence in sequences]
+        for m, sequence in enumerate(self.sequences):
+            self._update_pointers(m, 0)
+        if self._processing is not None:
+            for m, sequence in enumerate(self.sequences):
+                for n in sequence:
+                    d = self._processing[n, m]
+                    if d < 0:
+                        raise ValueError(f"{self.employees[m]} can't do task {self.compiled.names[n]}")
+                    self._durations[n] = d
+        self.machine_load = array('q', (sum(self._durations[n] for n in sequence) for sequence in self.sequences))
+
+        self.schedule_valid = False
+        self.tails_valid = False
+        self.update_topological_order()
         self.update_transitive_deps()
+        self.fingerprint = 0
+        for n in range(self.compiled.num_nodes):
+            self.fingerprint ^= self._pair_hash(n, self._left(n), self.machine_of[n])
+
+    def copy_sequences(self):
+        return [array('i', sequence) for sequence in self.sequences]
+
+    # Zobrist-style: every task hashed together with the task right before it, or
+    # with its employee if it is first. Those pairs pin down every sequence, and a
+    # move changes only three of them.
+    def _pair_hash(self, n, left, m):
+        return _mix64(n * (self.compiled.num_nodes + len(self.sequences)) + (left if left is not None else self.compiled.num_nodes + m))
+
+    # The fingerprint after the move, without applying it
+    def _move_fingerprint(self, n, move):
+        overrides = self._move_overrides(n, move[0], move[1])
+        if overrides is None:
+            return self.fingerprint
+        fingerprint = self.fingerprint
+        for x, new_left in overrides[0].items():
+            fingerprint ^= self._pair_hash(x, self._left(x), self.machine_of[x])
+            fingerprint ^= self._pair_hash(x, new_left, move[1][0] if x == n else self.machine_of[x])
+        return fingerprint
+
+    # The nodes a node has to wait for: the one left of it in its
+    # assignment list and its task children
+    def _waits_on(self, n):
+        i = self.position_of[n]
+        if i > 0:
+            yield self.sequences[self.machine_of[n]][i - 1]
+        yield from self._dep_indices[self._dep_offsets[n]:self._dep_offsets[n + 1]]
+
+    # The nodes waiting on a node: the one right of it in its assignment
+    # list and its task parents
+    def _waited_on_by(self, n):
+        sequence = self.sequences[self.machine_of[n]]
+        i = self.position_of[n]
+        if i + 1 < len(sequence):
+            yield sequence[i + 1]
+        yield from self._dependent_indices[self._dependent_offsets[n]:self._dependent_offsets[n + 1]]
+
+    # Runtime O(#nodes + #edges)
+    # Kahn's algorithm over the task edges plus the assignment order
+    def update_topological_order(self):
+        dep_offsets = self._dep_offsets
+        waiting = [dep_offsets[n + 1] - dep_offsets[n] + (1 if self.position_of[n] > 0 else 0) for n in range(self.compiled.num_nodes)]
+        ready = [n for n, w in enumerate(waiting) if w == 0]
+
+        order = []
+        while ready:
+            n = ready.pop()
+            order.append(n)
+            for r in self._waited_on_by(n):
+                waiting[r] -= 1
+                if waiting[r] == 0:
+                    ready.append(r)
+
+        if len(order) != self.compiled.num_nodes:
+            raise ValueError("assignments are circular, some tasks wait on themselves")
+        self.topological_order = array('i', order)
+        for i, n in enumerate(order):
+            self.topological_position[n] = i
+
+    # Pearce-Kelly: after adding an edge where after waits on before, reorder
+    # only the nodes between the two that are reachable from either end.
+    # A move adds at most one edge that goes against the current order.
+    # Returns the (node, new position) pairs, empty if the order still holds.
+    def _reorder(self, before, after, waits_on, waited_on_by):
+        position = self.topological_position
+        lower = position[after]
+        upper = position[before]
+        if lower > upper:
+            return []
+
+        def reach(start, neighbours, in_window):
+            seen = {start}
+            stack = [start]
+            while stack:
+                for n in neighbours(stack.pop()):
+                    if n not in seen and in_window(position[n]):
+                        seen.add(n)
+                        stack.append(n)
+            return seen
+
+        forward = reach(after, waited_on_by, lambda p: p <= upper)
+        assert(before not in forward)
+        backward = reach(before, waits_on, lambda p: p >= lower)
+        moved = sorted(backward, key=position.__getitem__) + sorted(forward, key=position.__getitem__)
+        return list(zip(moved, sorted(position[n] for n in moved)))
+
+    def _restore_topological_order(self, before, after):
+        for n, p in self._reorder(before, after, self._waits_on, self._waited_on_by):
+            self.topological_order[p] = n
+            self.topological_position[n] = p
+
+    # Recompute the transitive deps of the changed nodes and of whatever waits
+    # on a node whose transitive deps actually changed, in topological order
+    def _propagate_transitive_deps(self, changed):
+        heap = [(self.topological_position[n], n) for n in changed]
+        heapq.heapify(heap)
+        queued = set(changed)
+        while heap:
+            _, n = heapq.heappop(heap)
+            bits = self._node_transitive_dep_bits(n)
+            if bits == self.transitive_dep_bits[n]:
+                continue
+            self.transitive_dep_bits[n] = bits
+            for r in self._waited_on_by(n):
+                if r not in queued:
+                    queued.add(r)
+                    heapq.heappush(heap, (self.topological_position[r], r))
+
+    # Runtime O(#nodes + #edges) to compute the schedule
+    def update_schedule(self):
+        start = self.start
+        finish = self.finish
+        durations = self._durations
+        dep_offsets = self._dep_offsets
+        dep_indices = self._dep_indices
+        for n in self.topological_order:
+            i = self.position_of[n]
+            s = finish[self.sequences[self.machine_of[n]][i - 1]] if i > 0 else 0
+            for k in range(dep_offsets[n], dep_offsets[n + 1]):
+                f = finish[dep_indices[k]]
+                if f > s:
+                    s = f
+            start[n] = s
+            finish[n] = s + durations[n]
+        self.schedule_valid = True
+
+    # Runtime O(#nodes changed * log)
+    # New durations by operation id. Processing times scale with the duration, so
+    # employees keep their speed relative to it. The task edges and orders don't change, so only the
+    # schedule from the changed tasks onwards gets recomputed.
+    def set_durations(self, durations):
+        times = self.compiled.processing_times
+        if self.compiled.durations is self._shared_durations:
+            # the compiled graph can be shared with other graphs, or mapped read only
+            self.compiled = replace(self.compiled, durations=self.compiled.durations.copy(),
+                                    processing_times=None if times is None else times.copy())
+            times = self.compiled.processing_times
+            if self.processing is None:
+                self._durations = self.compiled.durations.data
+        for n, d in durations.items():
+            if times is not None:
+                nominal = int(self.compiled.durations[n])
+                self.compiled.durations[n] = d
+                rescale_processing_times(times[n], nominal, d)
+                if self.processing is not None:
+                    rescale_processing_times(self.processing[n], nominal, d)
+                    if self.sequences:
+                        d = int(self.processing[n, self.machine_of[n]])
+            if self.sequences:
+                self.machine_load[self.machine_of[n]] += d - self._durations[n]
+            self._durations[n] = d
+        self.bounds = dict()
+        self.tails_valid = False
+        if not self.schedule_valid:
+            return
+        start, finish, position = self.start, self.finish, self.topological_position
+        heap = [(position[n], n) for n in durations]
+        heapq.heapify(heap)
+        queued = set(durations)
+        while heap:
+            _, x = heapq.heappop(heap)
+            i = self.position_of[x]
+            sequence = self.sequences[self.machine_of[x]]
+            s = finish[sequence[i - 1]] if i > 0 else 0
+            for k in range(self._dep_offsets[x], self._dep_offsets[x + 1]):
+                if finish[self._dep_indices[k]] > s:
+                    s = finish[self._dep_indices[k]]
+            if s == start[x] and s + self._durations[x] == finish[x]:
+                continue
+            start[x] = s
+            finish[x] = s + self._durations[x]
+            after = [sequence[i + 1]] if i + 1 < len(sequence) else []
+            after += self._dependent_indices[self._dependent_offsets[x]:self._dependent_offsets[x + 1]]
+            for r in after:
+                if r not in queued:
+                    queued.add(r)
+                    heapq.heappush(heap, (position[r], r))
+
+    # Same as update_schedule backwards, for how long it takes from each node to the end
+    def update_tails(self):
+        tail = self.tail
+        durations = self._durations
+        dependent_offsets = self._dependent_offsets
+        dependent_indices = self._dependent_indices
+        for n in reversed(self.topological_order):
+            sequence = self.sequences[self.machine_of[n]]
+            i = self.position_of[n]
+            t = tail[sequence[i + 1]] if i + 1 < len(sequence) else 0
+            for k in range(dependent_offsets[n], dependent_offsets[n + 1]):
+                if tail[dependent_indices[k]] > t:
+                    t = tail[dependent_indices[k]]
+            tail[n] = t + durations[n]
+        self.tails_valid = True
+
+    def _ensure_schedule(self):
+        if not self.schedule_valid:
+            self.update_schedule()
+
+    def earliest_start(self, node):
+        self._ensure_schedule()
+        return self.start[self.compiled.ids[node]]
+
+    def earliest_finish(self, node):
+        self._ensure_schedule()
+        return self.finish[self.compiled.ids[node]]
 
     def node_completion_time(self, node):
-        data = self.graph.nodes[node]
-        assignment_pointer = self.assignment_pointers[node]
-        if assignment_pointer[1] == 0 and data['leaf']:
-            return data['duration']
-        # max of completion time by moving left in the assignment list ( current person working on previously assigned task )
-        # and the max completion time of the subtasks
-        return data['duration'] + \
-                    max(self.node_completion_time(self.assignments[assignment_pointer[0]][assignment_pointer[1] - 1]) \
-                        if assignment_pointer[1] > 0 else 0,
-                        max([self.node_completion_time(c) for c in self.graph.successors(node)] + [0]))
+        return self.earliest_finish(node)
 
     def completion_time(self):
-        return self.node_completion_time(self.last_task)
+        self._ensure_schedule()
+        return self.finish[self.last_task_id]
+
+    # Walks back from the last task, always following a node that finishes exactly
+    # when the current one starts. Returned in execution order.
+    def _critical_path(self):
+        self._ensure_schedule()
+        n = self.last_task_id
+        path = [n]
+        while self.start[n] > 0:
+            n = next(w for w in self._waits_on(n) if self.finish[w] == self.start[n])
+            path.append(n)
+        path.reverse()
+        return path
+
+    def critical_path(self):
+        return [self.compiled.names[n] for n in self._critical_path()]
+
+    def _left(self, n):
+        i = self.position_of[n]
+        return self.sequences[self.machine_of[n]][i - 1] if i > 0 else None
+
+    def _right(self, n):
+        sequence = self.sequences[self.machine_of[n]]
+        i = self.position_of[n]
+        return sequence[i + 1] if i + 1 < len(sequence) else None
+
+    # The left and right neighbours that change if n is moved, as
+    # {node: new left} and {node: new right}. None if the move doesn't change anything.
+    def _move_overrides(self, n, remove, add):
+        if remove[0] == add[0] and add[1] - remove[1] in (0, 1):
+            return None
+        sequence = self.sequences[remove[0]]
+        p1 = sequence[remove[1] - 1] if remove[1] > 0 else None
+        s1 = sequence[remove[1] + 1] if remove[1] + 1 < len(sequence) else None
+        target = self.sequences[add[0]]
+        p2 = target[add[1] - 1] if add[1] > 0 else None
+        s2 = target[add[1]] if add[1] < len(target) else None
+        left = {n: p2}
+        right = {n: s2}
+        # the gap n leaves closes up...
+        if s1 is not None:
+            left[s1] = p1
+        if p1 is not None:
+            right[p1] = s1
+        # ...and n goes between p2 and s2
+        if s2 is not None:
+            left[s2] = n
+        if p2 is not None:
+            right[p2] = n
+        return left, right
 
-    def get_valid_moves(self):
+    # _waits_on and _waited_on_by as if the overrides were applied
+    def _overridden_neighbours(self, left, right):
+        dep_offsets = self._dep_offsets
+        dep_indices = self._dep_indices
+        dependent_offsets = self._dependent_offsets
+        dependent_indices = self._dependent_indices
+
+        def waits_on(n):
+            l = left[n] if n in left else self._left(n)
+            if l is not None:
+                yield l
+            yield from dep_indices[dep_offsets[n]:dep_offsets[n + 1]]
+
+        def waited_on_by(n):
+            r = right[n] if n in right else self._right(n)
+            if r is not None:
+                yield r
+            yield from dependent_indices[dependent_offsets[n]:dependent_offsets[n + 1]]
+
+        return waits_on, waited_on_by
+
+    # Starts and finishes after moving n, as {node: value} for only the nodes that
+    # change, without moving anything. Walks forward in topological order from the
+    # nodes that wait on something new and stops wherever a finish doesn't change,
+    # so it costs O(#affected nodes) on top of reordering like the move would.
+    # moved is (n, its duration where it goes) when that differs from now.
+    def _move_heads(self, left, right, key, moved=(None, 0)):
+        sequences, machine_of, position_of = self.sequences, self.machine_of, self.position_of
+        dep_offsets, dep_indices = self._dep_offsets, self._dep_indices
+        dependent_offsets, dependent_indices = self._dependent_offsets, self._dependent_indices
+        old_start, old_finish = self.start, self.finish
+        durations = self._durations
+        moved_node, moved_duration = moved
+        start = dict()
+        finish = dict()
+        heap = [(key(x), x) for x in left]
+        heapq.heapify(heap)
+        queued = set(left)
+        while heap:
+            _, x = heapq.heappop(heap)
+            if x in left:
+                l = left[x]
+            else:
+                i = position_of[x]
+                l = sequences[machine_of[x]][i - 1] if i > 0 else None
+            s = 0 if l is None else finish.get(l, old_finish[l])
+            for k in range(dep_offsets[x], dep_offsets[x + 1]):
+                f = finish.get(dep_indices[k], old_finish[dep_indices[k]])
+                if f > s:
+                    s = f
+            f = s + (moved_duration if x == moved_node else durations[x])
+            if s == old_start[x] and f == old_finish[x]:
+                continue
+            start[x] = s
+            finish[x] = f
+            if x in right:
+                r = right[x]
+            else:
+                sequence = sequences[machine_of[x]]
+                i = position_of[x]
+                r = sequence[i + 1] if i + 1 < len(sequence) else None
+            if r is not None and r not in queued:
+                queued.add(r)
+                heapq.heappush(heap, (key(r), r))
+            for k in range(dependent_offsets[x], dependent_offsets[x + 1]):
+                r = dependent_indices[k]
+                if r not in queued:
+                    queued.add(r)
+                    heapq.heappush(heap, (key(r), r))
+        return start, finish
+
+    # A topological position for every node as if n had been moved
+    def _move_topological_key(self, n, left, right):
+        waits_on, waited_on_by = self._overridden_neighbours(left, right)
+        reordered = []
+        if left[n] is not None:
+            reordered = self._reorder(left[n], n, waits_on, waited_on_by)
+        if not reordered and right[n] is not None:
+            reordered = self._reorder(n, right[n], waits_on, waited_on_by)
+        overrides = dict(reordered)
+        position = self.topological_position
+        return lambda x: overrides[x] if x in overrides else position[x]
+
+    # What _move_heads needs to know about n's duration after the move
+    def _moved(self, n, move):
+        if self._processing is None or move[0][0] == move[1][0]:
+            return (None, 0)
+        return (n, self._processing[n, move[1][0]])
+
+    def _evaluate_move(self, n, move):
+        self._ensure_schedule()
+        overrides = self._move_overrides(n, move[0], move[1])
+        if overrides is None:
+            return self.finish[self.last_task_id]
+        left, right = overrides
+        _, finish = self._move_heads(left, right, self._move_topological_key(n, left, right), self._moved(n, move))
+        return finish.get(self.last_task_id, self.finish[self.last_task_id])
+
+    # Makespan after the move, exactly, without applying it
+    def evaluate_move(self, node, move):
+        return self._evaluate_move(*self._to_internal_move(node, move))
+
+    # O(#deps of n) guess at the makespan after the move from the current heads and
+    # tails: the longest path through n in its new place or across the gap it
+    # leaves. Doesn't see heads and tails that move because n left, so it is not a
+    # bound, but it is good enough for TabuSearch to screen moves with.
+    def _estimate_move(self, n, move):
+        self._ensure_schedule()
+        if not self.tails_valid:
+            self.update_tails()
+        overrides = self._move_overrides(n, move[0], move[1])
+        if overrides is None:
+            return self.finish[self.last_task_id]
+        left, right = overrides
+        finish = self.finish
+        tail = self.tail
+        head = finish[left[n]] if left[n] is not None else 0
+        for k in range(self._dep_offsets[n], self._dep_offsets[n + 1]):
+            head = max(head, finish[self._dep_indices[k]])
+        after = tail[right[n]] if right[n] is not None else 0
+        for k in range(self._dependent_offsets[n], self._dependent_offsets[n + 1]):
+            after = max(after, tail[self._dependent_indices[k]])
+        estimate = head + self._duration_on(n, move[1][0]) + after
+        for p, s in right.items():
+            if p != n and s is not None and s != n:
+                estimate = max(estimate, finish[p] + tail[s])
+        return estimate
+
+    def estimate_move(self, node, move):
+        return self._estimate_move(*self._to_internal_move(node, move))
+
+    # LowerBounds for the current number of employees, cached per count. With
+    # processing times every task counts with the fastest any of them does it.
+    def lower_bounds(self):
+        m = len(self.sequences)
+        if m not in self.bounds:
+            durations = None
+            if self.processing is not None and m:
+                durations = numpy.where(self.processing >= 0, self.processing, numpy.iinfo(numpy.int64).max).min(axis=1)
+            self.bounds[m] = lower_bounds(self.compiled, m, durations)
+        return self.bounds[m]
+
+    # Runtime O(1)
+    # Lower bound on the makespan after a move: its employee has to work through
+    # everything in its sequence one task at a time
+    def _move_load_bound(self, n, move):
+        remove, add = move
+        if add[0] == remove[0]:
+            return self.machine_load[add[0]]
+        return self.machine_load[add[0]] + self._duration_on(n, add[0])
+
+    # Machine indices n can be moved to
+    def _machines_for(self, n):
+        if self.eligible is None or self.eligible[n] is None:
+            return range(len(self.sequences))
+        return self.eligible[n]
+
+    # Runtime O(#nodes) per node
+    # Moves are (operation id, ((machine, index), (machine, index)))
+    def _node_valid_moves(self, n):
+        deps = self.transitive_dep_bits[n]
+        n_bit = 1 << n
+        assignment_pointer = (self.machine_of[n], self.position_of[n])
         moves = []
+        for m in self._machines_for(n):
+            sequence = self.sequences[m]
+            # I cannot go before anything I transitively wait on...
+            first = 0
+            for i, task in enumerate(sequence):
+                if deps >> task & 1:
+                    first = i + 1
+            # ...or after anything that transitively waits on me
+            last = len(sequence)
+            for i in range(first, len(sequence)):
+                if self.transitive_dep_bits[sequence[i]] & n_bit:
+                    last = i
+                    break
+            for i in range(first, last + 1):
+                # putting it right back where it is doesn't do anything
+                if m == assignment_pointer[0] and i - assignment_pointer[1] in (0, 1):
+                    continue
+                moves.append((n, (assignment_pointer, (m, i))))
+        return moves
+
+    def _to_public_move(self, move):
+        n, (remove, add) = move
+        return (self.compiled.names[n], ((self.employees[remove[0]], remove[1]), (self.employees[add[0]], add[1])))
+
+    def _to_internal_move(self, node, move):
+        remove, add = move
+        return (self.compiled.ids[node], ((self.employee_ids[remove[0]], remove[1]), (self.employee_ids[add[0]], add[1])))
+
+    # Runtime O(#deps of n)
+    # Whether the move leaves the assignments free of cycles. It can only close one
+    # through n: either something waiting on n ends up before it, or something n
+    # waits on ends up after it. Paths that don't go through n are the same before
+    # and after the move, so the bitsets answer both.
+    def _is_valid_move(self, n, move):
+        if self._processing is not None and self._processing[n, move[1][0]] < 0:
+            return False
+        overrides = self._move_overrides(n, move[0], move[1])
+        if overrides is None:
+            return False
+        left, right = overrides
+        new_left, new_right = left[n], right[n]
+        if new_left is not None:
+            bits = self.transitive_dep_bits[new_left]
+            for k in range(self._dependent_offsets[n], self._dependent_offsets[n + 1]):
+                d = self._dependent_indices[k]
+                if d == new_left or bits >> d & 1:
+                    return False
+        if new_right is not None:
+            for k in range(self._dep_offsets[n], self._dep_offsets[n + 1]):
+                d = self._dep_indices[k]
+                if d == new_right or self.transitive_dep_bits[d] >> new_right & 1:
+                    return False
+        return True
+
+    def is_valid_move(self, node, move):
+        return self._is_valid_move(*self._to_internal_move(node, move))
+
+    # Maximal runs of the critical path worked on back to back by one employee
+    def _critical_blocks(self):
+        blocks = []
+        previous = None
+        for n in self._critical_path():
+            if previous is not None and self.machine_of[n] == self.machine_of[previous] \
+                    and self.position_of[n] == self.position_of[previous] + 1:
+                blocks[-1].append(n)
+            else:
+                blocks.append([n])
+            previous = n
+        return blocks
+
+    def critical_blocks(self):
+        return [[self.compiled.names[n] for n in block] for block in self._critical_blocks()]
+
+    # Moves inside one critical block, unchecked
+    def _block_moves(self, blocks, neighbourhood):
+        for b, block in enumerate(blocks):
+            if len(block) < 2:
+                continue
+            m = self.machine_of[block[0]]
+            first = self.position_of[block[0]]
+            last = self.position_of[block[-1]]
+            if neighbourhood == Neighbourhood.N5:
+                # swapping the first two of the first block or the last two of the
+                # last block can't make the path shorter
+                if b > 0:
+                    yield (block[0], ((m, first), (m, first + 2)))
+                if b < len(blocks) - 1:
+                    yield (block[-2], ((m, last - 1), (m, last + 1)))
+                continue
+            for j, n in enumerate(block):
+                i = first + j
+                if j > 0:
+                    yield (n, ((m, i), (m, first)))
+                if j < len(block) - 1:
+                    yield (n, ((m, i), (m, last + 1)))
+                if 0 < j < len(block) - 1:
+                    yield (block[0], ((m, first), (m, i + 1)))
+                    yield (block[-1], ((m, last), (m, i)))
+
+    # Runtime O(log #tasks on the machine)
+    # First index into sequence of a task whose times[task] is after t, times
+    # being starts or finishes, which never go down along a sequence
+    @staticmethod
+    def _first_after(sequence, times, t):
+        low, high = 0, len(sequence)
+        while low < high:
+            middle = (low + high) // 2
+            if times[sequence[middle]] > t:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    # Positions on machine m worth moving n to: from the first task still running
+    # when n starts to the first one that starts once n finishes. Going any
+    # earlier only delays tasks n can't start before anyway, any later only delays n.
+    def _reassign_window(self, n, m):
+        sequence = self.sequences[m]
+        first = self._first_after(sequence, self.finish, self.start[n])
+        last = self._first_after(sequence, self.start, self.finish[n] - 1)
+        return range(first, max(first, last) + 1)
+
+    # The _reassign_window on every other employee that can do it for each critical task, unchecked
+    def _reassign_moves(self, blocks):
+        for block in blocks:
+            for n in block:
+                remove = (self.machine_of[n], self.position_of[n])
+                for m in self._machines_for(n):
+                    if m != remove[0]:
+                        for i in self._reassign_window(n, m):
+                            yield (n, (remove, (m, i)))
+
+    def _iter_moves(self, neighbourhood=Neighbourhood.ALL):
+        if neighbourhood == Neighbourhood.ALL:
+            for n in range(self.compiled.num_nodes):
+                yield from self._node_valid_moves(n)
+            return
+        blocks = self._critical_blocks()
+        seen = set()
+        for move in self._block_moves(blocks, neighbourhood):
+            if move not in seen and self._is_valid_move(*move):
+                seen.add(move)
+                yield move
+        for move in self._reassign_moves(blocks):
+            if self._is_valid_move(*move):
+                yield move
+
+    # Lazily, so a caller that stops early never pays for the rest
+    def iter_moves(self, neighbourhood=Neighbourhood.ALL):
+        for move in self._iter_moves(neighbourhood):
+            yield self._to_public_move(move)
+
+    # At most k distinct valid moves drawn at random, trying at most attempts
+    # candidates, so the work is bounded however big the neighbourhood is
+    def _sample_moves(self, neighbourhood, k, rng=random, attempts=None):
+        if neighbourhood == Neighbourhood.ALL:
+            candidates = range(self.compiled.num_nodes)
+            block_moves = []
+        else:
+            blocks = self._critical_blocks()
+            candidates = [n for block in blocks for n in block]
+            block_moves = list(set(self._block_moves(blocks, neighbourhood)))
+        moves = set()
+        for _ in range(attempts if attempts is not None else 4 * k):
+            if len(moves) >= k:
+                break
+            # a block move or sending a random candidate to a random position, in
+            # its _reassign_window unless the neighbourhood is ALL
+            if block_moves and rng.random() < 0.5:
+                move = rng.choice(block_moves)
+            else:
+                n = rng.choice(candidates)
+                if self.eligible is not None and self.eligible[n] is not None:
+                    m = rng.choice(self.eligible[n])
+                else:
+                    m = rng.randrange(len(self.sequences))
+                if neighbourhood == Neighbourhood.ALL:
+                    i = rng.randrange(len(self.sequences[m]) + 1)
+                elif m == self.machine_of[n]:
+                    continue
+                else:
+                    i = rng.choice(self._reassign_window(n, m))
+                move = (n, ((self.machine_of[n], self.position_of[n]), (m, i)))
+            if move not in moves and self._is_valid_move(*move):
+                moves.add(move)
+        return moves
+
+    def sample_moves(self, neighbourhood, k, rng=random, attempts=None):
+        return {self._to_public_move(move) for move in self._sample_moves(neighbourhood, k, rng, attempts)}
+
+    def get_valid_moves(self, neighbourhood=Neighbourhood.ALL):
         # for each node, find out all the valid positions i can put it in
-        valid_moves = set()
-        for n in self.graph.nodes:
-            deps = self.assignment_aware_transitive_deps[n]
-            assignment_pointer = self.assignment_pointers[n]
-           
-            may_place_on_end = True
-            for employee, tasks in self.assignments.items():
-                tmp = deps.intersection(tasks)
-                i = 0
-                for i, task in enumerate(tasks):
-                    if task == n:
-                        continue
-                    if not any(tmp):
-                        valid_moves.add((n, (assignment_pointer, (employee, i))))
-                    tmp.discard(task)
-                    if n in self.assignment_aware_transitive_deps[task]:
-                        may_place_on_end = False
-                        break
-                if not any(tmp) and may_place_on_end:
-                    valid_moves.add((n, (assignment_pointer, (employee, i + 1))))
-        return valid_moves
+        return set(self.iter_moves(neighbourhood))
 
     # TODO: create class Assignment and Move
 
 
+    # Re-point every task at or after index start in this machine's sequence
+    def _update_pointers(self, m, start):
+        sequence = self.sequences[m]
+        for i in range(start, len(sequence)):
+            self.machine_of[sequence[i]] = m
+            self.position_of[sequence[i]] = i
+
     def _internal_apply_move(self, node, remove, add):
         # mark old one for deletion first
         same_task_list = remove[0] == add[0]
-        # if in the same list and index diff is 1, this move doesn't do anything
+        # putting it back in front of itself or of the task right after it doesn't do anything
         if same_task_list:
-            if abs(remove[1] - add[1]) <= 1:
+            if add[1] - remove[1] in (0, 1):
                 return (node, (remove, add))
-            popped = self.assignments[remove[0]].pop(remove[1])
+            popped = self.sequences[remove[0]].pop(remove[1])
             assert(node == popped)
-            self.assignment_pointers[node] = add
             if remove[1] > add[1]:
-                self.assignments[add[0]].insert(add[1], node)
+                self.sequences[add[0]].insert(add[1], node)
+                self._update_pointers(add[0], add[1])
                 return (node, (add, (remove[0], remove[1] + 1)))
             if remove[1] < add[1]:
-                self.assignments[add[0]].insert(add[1] - 1, node)
+                self.sequences[add[0]].insert(add[1] - 1, node)
+                self._update_pointers(add[0], remove[1])
                 return (node, ((add[0], add[1] - 1), remove))
         else:
-            popped = self.assignments[remove[0]].pop(remove[1])
+            popped = self.sequences[remove[0]].pop(remove[1])
             assert(node == popped)
-            self.assignments[add[0]].insert(add[1], node)
+            self.sequences[add[0]].insert(add[1], node)
+            self.machine_load[remove[0]] -= self._durations[node]
+            if self._processing is not None:
+                self._durations[node] = self._processing[node, add[0]]
+            self.machine_load[add[0]] += self._durations[node]
+            self._update_pointers(remove[0], remove[1])
+            self._update_pointers(add[0], add[1])
             return (node, (add, remove))
 
+    # (left, right) of a node in its sequence, None at either end
+    def _neighbours(self, n):
+        sequence = self.sequences[self.machine_of[n]]
+        i = self.position_of[n]
+        return (sequence[i - 1] if i > 0 else None, sequence[i + 1] if i + 1 < len(sequence) else None)
+
+    def _apply_move(self, n, move):
+        # work out the new schedule before anything moves, only the nodes it changes get written
+        schedule = None
+        self.fingerprint = self._move_fingerprint(n, move)
+        if self.schedule_valid:
+            overrides = self._move_overrides(n, move[0], move[1])
+            if overrides is not None:
+                left, right = overrides
+                schedule = self._move_heads(left, right, self._move_topological_key(n, left, right), self._moved(n, move))
+        _, old_right = self._neighbours(n)
+        reverse = self._internal_apply_move(n, move[0], move[1])
+        new_left, new_right = self._neighbours(n)
+        # old_right now waits on my old left, which was already before it. The only
+        # edges that can go against the order are me waiting on new_left and
+        # new_right waiting on me.
+        if new_left is not None:
+            self._restore_topological_order(new_left, n)
+        if new_right is not None:
+            self._restore_topological_order(n, new_right)
+        # only these three wait on something different now, everything else
+        # changes only if something it waits on did
+        self._propagate_transitive_deps([x for x in (n, old_right, new_right) if x is not None])
+        if schedule is not None:
+            start, finish = schedule
+            for x, s in start.items():
+                self.start[x] = s
+                self.finish[x] = finish[x]
+        self.tails_valid = False
+        return reverse
+
     # make sure you update assignment pointers
     # returns the move that reverses this change
     def apply_move(self, node, move): # Move is a tuple of assignment pointers, one to remove, one to place (('John', 2) -> ('Frank', 3))
-        return self._internal_apply_move(node, move[0], move[1])
-
-def build_graph(operations: list[Operation]):
-    g = networkx.DiGraph()
-    for operation in operations:
-        g.add_node(operation.name, duration=operation.duration, leaf=(not operation.deps))
-    for operation in operations:
-        for dep in operation.deps:
-            g.add_edge(operation.name, dep)
-    return TabuGraph(g)
+        reverse = self._apply_move(*self._to_internal_move(node, move))
+        return self._to_public_move(reverse)
+
+# splitmix64 finaliser
+def _mix64(x):
+    x = (x + 0x9e3779b97f4a7c15) & 0xffffffffffffffff
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & 0xffffffffffffffff
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & 0xffffffffffffffff
+    return x ^ (x >> 31)
+
+def build_graph(operations: list[Operation], employees: list[str] = None):
+    return TabuGraph(compile_operations(operations, employees))
@@ -0,0 +1,27 @@
+import unittest
+from tabu_search.instance_generator import KINDS, generate, lognormal_durations, to_json
+from tabu_search.loader import compile_instance
+from tabu_search.benchmark import regressions, run
+
+class BenchmarkTest(unittest.TestCase):
+    def test_generated_instances_are_valid(self):
+        for kind in KINDS:
+            operations = generate(kind, 200, fan_in=3, durations=lognormal_durations(), seed=1)
+            self.assertEqual(len(operations), 201)
+            # compile_instance raises on unknown deps, cycles and more than one last task
+            instance = compile_instance(to_json(operations, 4))
+            self.assertEqual(len(instance.employees), 4)
+            self.assertEqual(generate(kind, 200, fan_in=3, durations=lognormal_durations(), seed=1), operations)
+        jobs = {o.job for o in generate('multi_job', 100, num_jobs=7, seed=2)}
+        self.assertEqual(len(jobs), 8)
+
+    def test_run(self):
+        results = run(['random'], [30], num_employees=3, repeat=1, solver_seconds=0.1)
+        result = results['results'][0]
+        self.assertLessEqual(result['solver']['best'], result['solver']['initial'])
+        self.assertEqual(regressions(results, results), [])
+        slower = {'results': [dict(result, build_graph={'min': 2 * result['build_graph']['min'] + 1})]}
+        self.assertEqual([r[2] for r in regressions(results, slower)], ['build_graph'])
+
+if __name__ == '__main__':
+    unittest.main()
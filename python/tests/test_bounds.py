@@ -0,0 +1,49 @@
+import unittest
+import random
+from tabu_search.input_types import *
+from tabu_search.bounds import gap, lower_bounds
+from tabu_search.types import build_graph
+from tabu_search.search import StopReason, TabuConfig, TabuSearch, Budget, random_assignments
+
+class BoundsTest(unittest.TestCase):
+    basic2 = [Operation("A", 1, ["B", "C"], "J1"),
+              Operation("B", 3, ["D"], "J1"),
+              Operation("C", 4, ["E", "F"], "J1"),
+              Operation("D", 2, [], "J1"),
+              Operation("E", 2, [], "J1"),
+              Operation("F", 1, [], "J1")]
+
+    def test_bounds(self):
+        graph = build_graph(self.basic2)
+        bounds = lower_bounds(graph.compiled, 2)
+        self.assertEqual(bounds.critical_path, 7)
+        self.assertEqual(bounds.work, 7)
+        self.assertEqual(bounds.value, 7)
+        self.assertEqual(lower_bounds(graph.compiled, 1).value, 13)
+        # B, C and D are 15 units of work on two employees, so at least 8 before A's 1
+        wide = [Operation("A", 1, ["B", "C", "D"], "J1"),
+                Operation("B", 5, [], "J1"), Operation("C", 5, [], "J1"), Operation("D", 5, [], "J1")]
+        bounds = lower_bounds(build_graph(wide).compiled, 2)
+        self.assertEqual((bounds.critical_path, bounds.work, bounds.heads, bounds.tails), (6, 8, 8, 9))
+        self.assertEqual(gap(11, 11), 0)
+        self.assertEqual(gap(20, 15), 0.25)
+
+    def test_stops_at_optimum(self):
+        graph = build_graph(self.basic2)
+        graph.update_assignments({'John': ["F", "E", "D", "C", "B", "A"], 'Frank': []})
+        search = TabuSearch(graph, TabuConfig(seed=1))
+        best = search.solve(Budget(iterations=1000))
+        self.assertEqual(search.stop_reason, StopReason.OPTIMAL)
+        self.assertEqual((best.makespan, best.gap), (7, 0))
+        self.assertLess(search.iteration, 1000)
+
+    def test_bounds_hold(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            operations = [Operation(str(i), rng.randint(1, 9), [str(d) for d in rng.sample(range(i), min(i, 2))], "J1") for i in range(15)]
+            operations.append(Operation("end", 1, [str(i) for i in range(15)], "J1"))
+            graph = build_graph(operations)
+            graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], rng))
+            search = TabuSearch(graph, TabuConfig(seed=seed))
+            search.run(200)
+            self.assertGreaterEqual(search.best_time, graph.lower_bounds().value)
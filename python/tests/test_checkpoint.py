@@ -0,0 +1,70 @@
+import unittest
+import pathlib
+import random
+import tempfile
+from tabu_search.checkpoint import Checkpointer, resume, save_checkpoint
+from tabu_search.instance_generator import generate
+from tabu_search.loader import InstanceError
+from tabu_search.search import Budget, StopReason, TabuConfig, TabuRule, TabuSearch, random_assignments
+from tabu_search.types import build_graph
+
+class CheckpointTest(unittest.TestCase):
+    def search(self, config):
+        graph = build_graph(generate('layered', 30, width=5, seed=1))
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(2)))
+        return TabuSearch(graph, config)
+
+    def test_same_trajectory(self):
+        for config in [TabuConfig(tenure=4, sample_size=20, seed=3), TabuConfig(tenure=4, tabu_rule=TabuRule.FINGERPRINT, seed=3)]:
+            straight = self.search(config)
+            straight.run(60)
+            with tempfile.TemporaryDirectory() as tmp:
+                path = pathlib.Path(tmp) / "search.checkpoint"
+                interrupted = self.search(config)
+                interrupted.run(30)
+                save_checkpoint(path, interrupted)
+                resumed = resume(path, build_graph(generate('layered', 30, width=5, seed=1)).compiled)
+            self.assertEqual(resumed.iteration, 30)
+            resumed.run(30)
+            self.assertEqual(resumed.graph.assignments, straight.graph.assignments)
+            self.assertEqual(resumed.best_assignments(), straight.best_assignments())
+            self.assertEqual(resumed.best_time, straight.best_time)
+            self.assertEqual(resumed.rng.getstate(), straight.rng.getstate())
+
+    def test_resumed_budget(self):
+        config = TabuConfig(tenure=4, sample_size=20, seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "search.checkpoint"
+            def interrupt(search):
+                if search.iteration == 30:
+                    save_checkpoint(path, search)
+            straight = self.search(config)
+            straight.solve(Budget(iterations=60), on_step=interrupt)
+            resumed = resume(path, build_graph(generate('layered', 30, width=5, seed=1)).compiled)
+            resumed.solve(Budget(iterations=60))
+            self.assertEqual(resumed.stop_reason, StopReason.ITERATIONS)
+            self.assertEqual(resumed.iteration, 60)
+            self.assertEqual(resumed.best_assignments(), straight.best_assignments())
+
+            # a checkpoint of a finished search doesn't start it over
+            save_checkpoint(path, resumed)
+            finished = resume(path, resumed.graph.compiled)
+            finished.solve(Budget(iterations=60))
+            self.assertEqual(finished.iteration, 60)
+            # but a new budget after that does
+            finished.solve(Budget(iterations=5))
+            self.assertGreater(finished.iteration, 60)
+
+    def test_checkpointer(self):
+        search = self.search(TabuConfig(tenure=4, sample_size=20, seed=5))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "search.checkpoint"
+            checkpointer = Checkpointer(path, interval=0)
+            search.solve(Budget(iterations=10), on_step=checkpointer)
+            self.assertEqual(checkpointer.saves, 10)
+            self.assertEqual(resume(path, search.graph.compiled).iteration, search.iteration)
+            with self.assertRaisesRegex(InstanceError, "different instance"):
+                resume(path, build_graph(generate('layered', 30, width=5, seed=2)).compiled)
+            path.write_bytes(path.read_bytes()[:200])
+            with self.assertRaisesRegex(InstanceError, "truncated"):
+                resume(path, search.graph.compiled)
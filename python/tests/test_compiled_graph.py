@@ -0,0 +1,35 @@
+import unittest
+import networkx
+from tabu_search.input_types import *
+from tabu_search.compiled_graph import compile_operations
+from tabu_search.types import TabuGraph
+
+class CompiledGraphTest(unittest.TestCase):
+    basic2 = [Operation("A", 1, ["B", "C"], "J1"),
+              Operation("B", 3, ["D"], "J1"),
+              Operation("C", 4, ["E", "F"], "J2"),
+              Operation("D", 2, [], "J1"),
+              Operation("E", 2, [], "J2"),
+              Operation("F", 1, [], "J2")]
+
+    def test_csr(self):
+        g = compile_operations(self.basic2)
+        self.assertEqual(g.names, ["A", "B", "C", "D", "E", "F"])
+        self.assertEqual(list(g.deps(g.ids["C"])), [g.ids["E"], g.ids["F"]])
+        self.assertEqual(list(g.dependents(g.ids["D"])), [g.ids["B"]])
+        self.assertEqual(list(g.dependents(g.ids["B"])), [g.ids["A"]])
+        self.assertEqual(list(g.sinks()), [g.ids["A"]])
+        self.assertEqual([g.job_names[j] for j in g.jobs], ["J1", "J1", "J2", "J1", "J2", "J2"])
+        self.assertEqual(int(g.durations.sum()), 13)
+
+    def test_networkx_input(self):
+        nx = networkx.DiGraph()
+        for operation in self.basic2:
+            nx.add_node(operation.name, duration=operation.duration)
+        for operation in self.basic2:
+            for dep in operation.deps:
+                nx.add_edge(operation.name, dep)
+        graph = TabuGraph(nx)
+        graph.update_assignments({'John': ['D', 'E', 'C'], 'Frank': ['F', 'B', 'A']})
+        self.assertEqual(graph.completion_time(), 9)
+        self.assertEqual(graph.last_task, "A")
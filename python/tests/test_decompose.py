@@ -0,0 +1,43 @@
+import unittest
+from tabu_search.input_types import *
+from tabu_search.compiled_graph import compile_operations
+from tabu_search.instance_generator import generate
+from tabu_search.decompose import DecomposeConfig, components, solve_decomposed, split_employees, subgraph
+from tabu_search.search import Budget, TabuConfig
+from tabu_search.types import TabuGraph
+
+class DecomposeTest(unittest.TestCase):
+    def test_components(self):
+        compiled = compile_operations(generate('multi_job', 60, num_jobs=4, seed=3))
+        parts = components(compiled)
+        self.assertEqual(len(parts), 4)
+        for part in parts:
+            self.assertEqual(len({compiled.jobs[x] for x in part}), 1)
+        self.assertEqual(sorted(x for p in parts for x in p.tolist()), list(range(compiled.num_nodes - 1)))
+
+        # two unconnected tasks of one job stay together unless by_job is off
+        operations = [Operation("A", 1, [], "J1"), Operation("B", 1, [], "J1"), Operation("C", 1, [], "J2"), Operation("end", 0, ["A", "B", "C"], "end")]
+        self.assertEqual(len(components(compile_operations(operations))), 2)
+        self.assertEqual(len(components(compile_operations(operations), by_job=False)), 3)
+
+    def test_subgraph(self):
+        compiled = compile_operations(generate('multi_job', 30, num_jobs=3, seed=4))
+        part = components(compiled)[0]
+        sub = subgraph(compiled, part)
+        self.assertEqual(sub.num_nodes, len(part) + 1)
+        self.assertEqual(list(sub.sinks()), [len(part)])
+        self.assertEqual(int(sub.durations[-1]), 0)
+
+    def test_split_employees(self):
+        self.assertEqual(split_employees([10, 10, 10], 3), [1, 1, 1])
+        self.assertEqual(split_employees([30, 10], 4), [3, 1])
+
+    def test_solve(self):
+        compiled = compile_operations(generate('multi_job', 120, num_jobs=6, seed=5))
+        employees = ['a', 'b', 'c', 'd']
+        config = DecomposeConfig(budget=Budget(iterations=30), refine=Budget(iterations=10), tabu=TabuConfig(sample_size=20), seed=5, workers=2)
+        assignments, best = solve_decomposed(compiled, employees, config)
+        graph = TabuGraph(compiled)
+        graph.update_assignments(assignments)
+        self.assertEqual(graph.completion_time(), best)
+        self.assertGreaterEqual(best, graph.lower_bounds().value)
@@ -0,0 +1,60 @@
+import unittest
+import json
+import pathlib
+import tempfile
+from tabu_search.loader import InstanceError, compile_instance, load_instance
+from tabu_search.types import TabuGraph
+
+class LoaderTest(unittest.TestCase):
+    def instance(self, operations):
+        return {'operations': [{'name': n, 'duration': d, 'deps': deps, 'job': "J1"} for n, d, deps in operations],
+                'employees': [{'name': "John"}, {'name': "Frank"}]}
+
+    basic2 = [("A", 1, ["B", "C"]), ("B", 3, ["D"]), ("C", 4, ["E", "F"]), ("D", 2, []), ("E", 2, []), ("F", 1, [])]
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(InstanceError, "unknown task X"):
+            compile_instance(self.instance([("A", 1, ["X"])]))
+        with self.assertRaisesRegex(InstanceError, "circular"):
+            compile_instance(self.instance([("A", 1, ["B"]), ("B", 1, ["C"]), ("C", 1, ["B"])]))
+        with self.assertRaisesRegex(InstanceError, "one last task"):
+            compile_instance(self.instance([("A", 1, ["C"]), ("B", 1, ["C"]), ("C", 1, [])]))
+        with self.assertRaisesRegex(InstanceError, "repeated"):
+            compile_instance(self.instance([("A", 1, []), ("A", 1, [])]))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = pathlib.Path(tmp) / "basic2.json"
+            source.write_text(json.dumps(self.instance(self.basic2)))
+            first = load_instance(source, tmp)
+            second = load_instance(source, tmp)
+            self.assertEqual(first.path, second.path)
+            self.assertEqual(second.employees, ["John", "Frank"])
+            self.assertEqual(second.compiled.names, first.compiled.names)
+            self.assertEqual(second.compiled.deps(second.compiled.ids["C"]).tolist(), [second.compiled.ids["E"], second.compiled.ids["F"]])
+
+            graph = TabuGraph(second.compiled)
+            graph.update_assignments({'John': ['D', 'E', 'C'], 'Frank': ['F', 'B', 'A']})
+            self.assertEqual(graph.completion_time(), 9)
+
+            # a damaged cache file gets rebuilt
+            second.path.write_bytes(second.path.read_bytes()[:40])
+            self.assertEqual(load_instance(source, tmp).compiled.names, first.compiled.names)
+
+    def test_processing_times(self):
+        data = self.instance(self.basic2)
+        data['operations'][1].update(processing_times={'John': 1}, eligible=['John'])
+        data['operations'][2]['processing_times'] = {'Frank': 2}
+        with tempfile.TemporaryDirectory() as tmp:
+            source = pathlib.Path(tmp) / "flexible.json"
+            source.write_text(json.dumps(data))
+            load_instance(source, tmp)
+            compiled = load_instance(source, tmp).compiled
+            self.assertEqual(compiled.processing_times.tolist(), [[1, 1], [1, -1], [4, 2], [2, 2], [2, 2], [1, 1]])
+            self.assertEqual(compiled.employee_names, ["John", "Frank"])
+        data['operations'][3]['eligible'] = ['Bob']
+        with self.assertRaisesRegex(InstanceError, "unknown employees"):
+            compile_instance(data)
+
+if __name__ == '__main__':
+    unittest.main()
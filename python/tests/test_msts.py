@@ -0,0 +1,42 @@
+import unittest
+import io
+from tabu_search.input_types import *
+from tabu_search.compiled_graph import compile_operations
+from tabu_search.types import TabuGraph
+from msts_translator.msts_representation import read_solution, write_jobs, write_msts
+
+class MstsTest(unittest.TestCase):
+    operations = [Operation("A", 1, ["B", "C"], "J1"),
+                  Operation("B", 3, ["D"], "J2", {'Frank': 5}),
+                  Operation("C", 4, ["E", "F"], "J1", None, ["John"]),
+                  Operation("D", 2, [], "J2"),
+                  Operation("E", 0, [], "J1"),
+                  Operation("F", 1, ["E"], "J1")]
+    employees = ["John", "Frank"]
+
+    def test_write(self):
+        out = io.StringIO()
+        write_msts(compile_operations(self.operations, self.employees), self.employees, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "6 6 2")
+        # before after job, after waits on before
+        self.assertEqual(sorted(lines[1:7]), ["1 0 0", "2 0 0", "3 1 1", "4 2 0", "4 5 0", "5 2 0"])
+        self.assertEqual(lines[7:], ["2 0 1 1 1", "2 0 3 1 5", "1 0 4", "2 0 2 1 2", "2 0 0 1 0", "2 0 1 1 1"])
+        jobs = io.StringIO()
+        write_jobs(compile_operations(self.operations, self.employees), jobs)
+        self.assertEqual(jobs.getvalue().splitlines(), ["J1", "J2"])
+
+    def test_solution(self):
+        compiled = compile_operations(self.operations, self.employees)
+        graph = TabuGraph(compiled)
+        assignments = {'John': ["E", "F", "C", "A"], 'Frank': ["D", "B"]}
+        graph.update_assignments(assignments)
+        solution = ["# operation employee start"]
+        for e, tasks in assignments.items():
+            solution += [f"{compiled.ids[t]} {self.employees.index(e)} {graph.earliest_start(t)} extra" for t in tasks]
+        # E and F both start at 0 on John, F still comes after E
+        self.assertEqual(read_solution(reversed(solution), compiled, self.employees), assignments)
+        with self.assertRaisesRegex(ValueError, "doesn't place"):
+            read_solution(solution[:-1], compiled, self.employees)
+        with self.assertRaisesRegex(ValueError, "placed twice"):
+            read_solution(solution + solution[-1:], compiled, self.employees)
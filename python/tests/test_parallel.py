@@ -0,0 +1,27 @@
+import unittest
+from tabu_search.input_types import *
+from tabu_search.compiled_graph import compile_operations
+from tabu_search.types import build_graph
+from tabu_search.search import TabuConfig
+from tabu_search.parallel import IslandConfig, IslandMode, decode_sequences, encode_sequences, solve_islands
+
+class ParallelTest(unittest.TestCase):
+    basic2 = [Operation("A", 1, ["B", "C"], "J1"),
+              Operation("B", 3, ["D"], "J1"),
+              Operation("C", 4, ["E", "F"], "J1"),
+              Operation("D", 2, [], "J1"),
+              Operation("E", 2, [], "J1"),
+              Operation("F", 1, [], "J1")]
+
+    def test_encoding(self):
+        sequences = [[3, 1, 4], [], [5, 9, 2, 6]]
+        self.assertEqual(decode_sequences(encode_sequences(sequences), 3), sequences)
+
+    def test_islands(self):
+        for mode in IslandMode:
+            config = IslandConfig(islands=2, epochs=2, iterations_per_epoch=20, mode=mode, tabu=TabuConfig(tenure=3), seed=4)
+            assignments, best = solve_islands(compile_operations(self.basic2), ['John', 'Frank'], config)
+            self.assertEqual(best, 7)
+            graph = build_graph(self.basic2)
+            graph.update_assignments(assignments)
+            self.assertEqual(graph.completion_time(), best)
@@ -0,0 +1,107 @@
+import unittest
+import random
+from tabu_search.input_types import *
+from tabu_search.instance_generator import generate
+from tabu_search.loader import InstanceError
+from tabu_search.replan import PlanDelta, apply_delta, replan
+from tabu_search.search import Budget, TabuConfig, random_assignments
+from tabu_search.types import build_graph
+
+class ReplanTest(unittest.TestCase):
+    def start(self, seed):
+        operations = generate('random', 80, window=10, seed=seed)
+        graph = build_graph(operations)
+        graph.update_assignments(random_assignments(graph, ['a', 'b', 'c'], random.Random(seed)))
+        return operations, graph
+
+    def check(self, graph, operations):
+        rebuilt = build_graph(operations)
+        rebuilt.update_assignments(graph.assignments)
+        self.assertEqual(rebuilt.completion_time(), graph.completion_time())
+
+    def test_durations(self):
+        operations, graph = self.start(1)
+        graph.completion_time()
+        rng = random.Random(1)
+        changes = {f"t{rng.randrange(80)}": rng.randint(1, 20) for _ in range(5)}
+        self.assertIs(apply_delta(graph, PlanDelta(durations=changes)), graph)
+        operations = [Operation(o.name, changes.get(o.name, o.duration), o.deps, o.job) for o in operations]
+        self.check(graph, operations)
+
+    def test_structural(self):
+        operations, graph = self.start(2)
+        before = graph.assignments
+        delta = PlanDelta(added=[Operation("x", 4, ["t10", "t20"], "J1"), Operation("y", 2, ["x"], "J1")],
+                          removed=["t15", "t30"],
+                          durations={"t40": 11},
+                          added_employees=['d'],
+                          removed_employees=['b'])
+        graph = apply_delta(graph, delta)
+        self.assertEqual(list(graph.assignments), ['a', 'c', 'd'])
+        # whatever wasn't moved keeps its order
+        kept = [t for t in before['a'] if t not in ("t15", "t30")]
+        self.assertEqual([t for t in graph.assignments['a'] if t in kept], kept)
+
+        removed = {"t15", "t30"}
+        deps = {o.name: o.deps for o in operations}
+        def resolve(d):
+            return [r for dd in deps[d] for r in resolve(dd)] if d in removed else [d]
+        operations = [Operation(o.name, 11 if o.name == "t40" else o.duration, list(dict.fromkeys(r for d in o.deps for r in resolve(d))), o.job)
+                      for o in operations if o.name not in removed]
+        operations[-1].deps.append("y")
+        operations += delta.added
+        self.check(graph, operations)
+
+        graph, best = replan(graph, PlanDelta(durations={"x": 1}), Budget(iterations=20), TabuConfig(seed=2))
+        self.assertEqual(graph.completion_time(), best.makespan)
+
+    def test_processing_times_scale(self):
+        operations = generate('random', 80, window=10, seed=4)
+        operations[5] = Operation("t5", 4, operations[5].deps, "J1", {'a': 8}, None)
+        operations[6] = Operation("t6", 3, operations[6].deps, "J1", {'b': 2}, ['a', 'b'])
+        for structural in (False, True):
+            graph = build_graph(operations, ['a', 'b', 'c'])
+            graph.update_assignments(random_assignments(graph, ['a', 'b', 'c'], random.Random(4)))
+            delta = PlanDelta(durations={"t5": 6, "t6": 9}, removed=["t30"] if structural else [])
+            graph = apply_delta(graph, delta)
+            expected = {"t5": Operation("t5", 6, operations[5].deps, "J1", {'a': 12}, None),
+                        "t6": Operation("t6", 9, operations[6].deps, "J1", {'b': 6}, ['a', 'b'])}
+            self.assertEqual(graph.compiled.operation(graph.compiled.ids["t5"]), expected["t5"])
+            self.assertEqual(graph.compiled.operation(graph.compiled.ids["t6"]), expected["t6"])
+            if not structural:
+                rebuilt = build_graph([expected.get(o.name, o) for o in operations], ['a', 'b', 'c'])
+                rebuilt.update_assignments(graph.assignments)
+                self.assertEqual(rebuilt.completion_time(), graph.completion_time())
+
+    def test_invalid(self):
+        _, graph = self.start(3)
+        with self.assertRaises(InstanceError):
+            apply_delta(graph, PlanDelta(removed=[graph.last_task]))
+        with self.assertRaises(InstanceError):
+            apply_delta(graph, PlanDelta(added=[Operation("x", 1, ["nope"], "J1")]))
+        with self.assertRaises(InstanceError):
+            apply_delta(graph, PlanDelta(removed_employees=['a', 'b', 'c']))
+        for delta in [PlanDelta(durations={"nope": 3}),
+                      PlanDelta(removed=["nope"]),
+                      PlanDelta(removed=["t5"], durations={"t5": 3})]:
+            with self.assertRaises(InstanceError):
+                apply_delta(graph, delta)
+
+    def test_added_durations(self):
+        _, graph = self.start(5)
+        graph = apply_delta(graph, PlanDelta(added=[Operation("x", 4, ["t10"], "J1")], durations={"x": 7, "t20": 2}))
+        self.assertEqual(graph.compiled.durations[graph.compiled.ids["x"]], 7)
+        self.assertEqual(graph.compiled.durations[graph.compiled.ids["t20"]], 2)
+
+    def test_rejected_leaves_graph(self):
+        operations = generate('random', 40, window=5, seed=4)
+        operations[3].eligible = ['b']
+        graph = build_graph(operations, ['a', 'b'])
+        graph.update_assignments(random_assignments(graph, ['a', 'b'], random.Random(4)))
+        assignments, makespan = graph.assignments, graph.completion_time()
+        with self.assertRaisesRegex(InstanceError, "nobody left"):
+            apply_delta(graph, PlanDelta(durations={operations[0].name: 50}, removed_employees=['b']))
+        self.assertEqual(graph.assignments, assignments)
+        self.assertEqual(graph.completion_time(), makespan)
+        self.assertEqual(graph.employees, ['a', 'b'])
+        self.assertTrue(graph.get_valid_moves())
@@ -0,0 +1,47 @@
+import unittest
+import random
+import numpy
+from tabu_search.instance_generator import generate
+from tabu_search.types import build_graph
+from tabu_search.sampling import best_random_sequences, sample_batch
+
+class SamplingTest(unittest.TestCase):
+    def test_makespans_match_graph(self):
+        graph = build_graph(generate('layered', 24, width=4, seed=3))
+        batch = sample_batch(graph.compiled, 3, 200, numpy.random.default_rng(0))
+        for b in range(200):
+            sequences = batch.sequences(b, 3)
+            self.assertEqual(sorted(n for s in sequences for n in s), list(range(graph.compiled.num_nodes)))
+            # load_sequences raises on an order that breaks a task edge
+            graph.load_sequences(sequences, ["a", "b", "c"])
+            self.assertEqual(graph.completion_time(), batch.makespans[b])
+
+    def test_best_first(self):
+        graph = build_graph(generate('layered', 24, width=4, seed=4))
+        best = best_random_sequences(graph.compiled, 2, 500, k=5, rng=numpy.random.default_rng(1))
+        self.assertEqual([t for t, _ in best], sorted(t for t, _ in best))
+        graph.load_sequences(best[0][1], ["a", "b"])
+        self.assertEqual(graph.completion_time(), best[0][0])
+
+        # drawn a few at a time, still the best few of them all, best first
+        chunked = best_random_sequences(graph.compiled, 2, 500, k=5, rng=numpy.random.default_rng(1), chunk_size=7)
+        self.assertEqual([t for t, _ in chunked], sorted(t for t, _ in chunked))
+        for t, sequences in chunked:
+            graph.load_sequences(sequences, ["a", "b"])
+            self.assertEqual(graph.completion_time(), t)
+
+    def test_eligibility(self):
+        operations = generate('layered', 24, width=4, seed=5)
+        rng = random.Random(2)
+        for o in operations[:-1]:
+            o.eligible = rng.sample(["a", "b", "c"], rng.randint(1, 2))
+            o.processing_times = {e: rng.randint(1, 9) for e in o.eligible}
+        graph = build_graph(operations, ["a", "b", "c"])
+        graph.set_employees(["c", "a", "b"])
+        batch = sample_batch(graph.compiled, 3, 100, numpy.random.default_rng(0), graph.processing)
+        for b in range(100):
+            graph.load_sequences(batch.sequences(b, 3))
+            self.assertEqual(graph.completion_time(), batch.makespans[b])
+
+if __name__ == '__main__':
+    unittest.main()
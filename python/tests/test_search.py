@@ -0,0 +1,132 @@
+import unittest
+import io
+import json
+import random
+import threading
+import time
+from tabu_search.input_types import *
+from tabu_search.instance_generator import generate
+from tabu_search.types import Neighbourhood, build_graph
+from tabu_search.search import Budget, StopReason, TabuConfig, TabuRule, TabuSearch, random_assignments
+from tabu_search.instrumentation import Instrumentation, JsonlSink, MemorySink
+
+class TabuSearchTest(unittest.TestCase):
+    basic2 = [Operation("A", 1, ["B", "C"], "J1"),
+              Operation("B", 3, ["D"], "J1"),
+              Operation("C", 4, ["E", "F"], "J1"),
+              Operation("D", 2, [], "J1"),
+              Operation("E", 2, [], "J1"),
+              Operation("F", 1, [], "J1")]
+
+    def test_finds_optimum(self):
+        # E -> C -> A is 7 long and 13 units of work need at least 7 on two employees
+        for rule in TabuRule:
+            graph = build_graph(self.basic2)
+            graph.update_assignments({'John': ["F", "E", "D", "C", "B", "A"], 'Frank': []})
+            search = TabuSearch(graph, TabuConfig(tabu_rule=rule, seed=1))
+            assignments, best = search.run(50)
+            self.assertEqual(best, 7)
+            check = build_graph(self.basic2)
+            check.update_assignments(assignments)
+            self.assertEqual(check.completion_time(), 7)
+
+    def test_fingerprint(self):
+        rng = random.Random(5)
+        operations = generate('layered', 24, width=4, seed=5)
+        graph = build_graph(operations)
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], rng))
+        seen = {graph.fingerprint: graph.assignments}
+        for _ in range(100):
+            node, move = rng.choice(sorted(graph.get_valid_moves(Neighbourhood.N7)))
+            predicted = graph._move_fingerprint(*graph._to_internal_move(node, move))
+            graph.apply_move(node, move)
+            self.assertEqual(graph.fingerprint, predicted)
+            rebuilt = build_graph(operations)
+            rebuilt.update_assignments(graph.assignments)
+            self.assertEqual(graph.fingerprint, rebuilt.fingerprint)
+            # equal fingerprints should mean equal assignments
+            self.assertEqual(seen.setdefault(graph.fingerprint, graph.assignments), graph.assignments)
+
+    def test_sampled_search(self):
+        operations = generate('layered', 32, width=4, seed=9)
+        graph = build_graph(operations)
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(9)))
+        initial = graph.completion_time()
+        search = TabuSearch(graph, TabuConfig(sample_size=10, seed=9))
+        _, best = search.run(100)
+        self.assertLessEqual(best, initial)
+        search.restore_best()
+        self.assertEqual(graph.completion_time(), best)
+
+    def test_instrumentation(self):
+        graph = build_graph(generate('layered', 24, width=4, seed=6))
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(6)))
+        initial = graph.completion_time()
+        instrumentation = Instrumentation(MemorySink())
+        search = TabuSearch(graph, TabuConfig(seed=6), instrumentation)
+        search.run(20)
+        records = instrumentation.sink.records
+        self.assertEqual([r['iteration'] for r in records], list(range(1, 21)))
+        self.assertEqual(records[-1]['best'], search.best_time)
+        for r in records:
+            self.assertLessEqual(r['evaluated'], r['neighbourhood'] + 1)
+            # only the best few estimates get evaluated exactly
+            self.assertLessEqual(r['evaluated'], search.config.evaluate_top + 1)
+            self.assertGreater(r['evaluate_seconds'], 0)
+        self.assertEqual(instrumentation.totals['improvements'] > 0, search.best_time < initial)
+        self.assertEqual(instrumentation.totals['neighbourhood'], sum(r['neighbourhood'] for r in records))
+
+        # the same run with a JSON lines sink writes the same counters
+        lines = io.StringIO()
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(6)))
+        TabuSearch(graph, TabuConfig(seed=6), Instrumentation(JsonlSink(lines))).run(20)
+        written = [json.loads(line) for line in lines.getvalue().splitlines()]
+        self.assertEqual([r['evaluated'] for r in written], [r['evaluated'] for r in records])
+
+    def test_budgets(self):
+        graph = build_graph(generate('layered', 32, width=4, seed=7))
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(7)))
+        search = TabuSearch(graph, TabuConfig(seed=7, sample_size=20))
+        incumbents = list(search.incumbents(Budget(iterations=60)))
+        self.assertEqual(search.stop_reason, StopReason.ITERATIONS)
+        self.assertEqual(search.iteration, 60)
+        makespans = [i.makespan for i in incumbents]
+        self.assertEqual(makespans, sorted(makespans, reverse=True))
+        self.assertEqual(len(set(makespans)), len(makespans))
+        self.assertEqual(makespans[-1], search.best_time)
+        check = build_graph(generate('layered', 32, width=4, seed=7))
+        check.update_assignments(incumbents[-1].assignments)
+        self.assertEqual(check.completion_time(), search.best_time)
+
+        seen = []
+        best = search.solve(Budget(stagnation=15, iterations=10000), seen.append)
+        self.assertEqual(search.stop_reason, StopReason.STAGNATION)
+        self.assertEqual(best.makespan, search.best_time)
+        self.assertEqual(seen[-1], best)
+
+        best = search.solve(Budget(seconds=0.05))
+        self.assertEqual(search.stop_reason, StopReason.SECONDS)
+        self.assertGreaterEqual(best.seconds, 0)
+
+        cancel = threading.Event()
+        threading.Timer(0.05, cancel.set).start()
+        search.solve(Budget(), cancel=cancel)
+        self.assertEqual(search.stop_reason, StopReason.CANCELLED)
+
+    def test_interrupted_step(self):
+        # one exhaustive step takes minutes here, the budget cuts it short
+        graph = build_graph(generate('random', 1000, seed=8))
+        graph.update_assignments(random_assignments(graph, ['John', 'Frank', 'Bob'], random.Random(8)))
+        search = TabuSearch(graph, TabuConfig(seed=8, evaluate_top=None))
+        start = time.perf_counter()
+        search.solve(Budget(seconds=0.5))
+        self.assertEqual(search.stop_reason, StopReason.SECONDS)
+        self.assertEqual(search.iteration, 1)
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertIsNone(search.deadline)
+
+        cancel = threading.Event()
+        threading.Timer(0.5, cancel.set).start()
+        search.solve(Budget(iterations=1000), cancel=cancel)
+        self.assertEqual(search.stop_reason, StopReason.CANCELLED)
+        self.assertEqual(search.iteration, 2)
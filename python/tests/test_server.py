@@ -0,0 +1,86 @@
+import unittest
+import json
+import threading
+import time
+from tabu_search.instance_generator import generate, to_json
+from tabu_search.server import LRU, ServerConfig, SolverServer
+
+class ServerTest(unittest.TestCase):
+    basic2 = {'operations': [{'name': "A", 'duration': 1, 'deps': ["B", "C"], 'job': "J1"},
+                             {'name': "B", 'duration': 3, 'deps': ["D"], 'job': "J1"},
+                             {'name': "C", 'duration': 4, 'deps': ["E", "F"], 'job': "J1"},
+                             {'name': "D", 'duration': 2, 'deps': [], 'job': "J1"},
+                             {'name': "E", 'duration': 2, 'deps': [], 'job': "J1"},
+                             {'name': "F", 'duration': 1, 'deps': [], 'job': "J1"}],
+              'employees': [{'name': "John"}, {'name': "Frank"}]}
+
+    def test_lru(self):
+        cache = LRU(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(list(cache.items), ["a", "c"])
+
+    def test_serve(self):
+        request = {'instance': self.basic2, 'budget': {'iterations': 20}, 'tabu': {'tenure': 3, 'seed': 1}}
+        lines = [json.dumps(dict(request, id=1)),
+                 json.dumps({'id': 2, 'instance': dict(self.basic2, operations=self.basic2['operations'][:1])}),
+                 "not json",
+                 "",
+                 json.dumps({'id': 3, 'instance': {'employees': []}}),
+                 json.dumps({'id': 5, 'instance': self.basic2, 'budget': {}})]
+        server = SolverServer(ServerConfig(workers=2))
+        try:
+            responses = []
+            server.serve(lines, responses.append)
+            by_id = {r['id']: r for r in responses}
+            self.assertEqual(len(responses), 5)
+            self.assertIn("seconds or iterations", by_id[5]['error'])
+            self.assertEqual(by_id[1]['makespan'], 7)
+            self.assertFalse(by_id[1]['cached'])
+            self.assertEqual(sorted(t for ts in by_id[1]['assignments'].values() for t in ts), list("ABCDEF"))
+            self.assertIn("unknown task B", by_id[2]['error'])
+            self.assertIn("operations", by_id[3]['error'])
+            self.assertIn('error', by_id[None])
+
+            # the same instance and settings again, keys in another order
+            again = []
+            server.serve([json.dumps({'tabu': {'seed': 1, 'tenure': 3}, 'budget': {'iterations': 20}, 'id': 4, 'instance': self.basic2})], again.append)
+            self.assertTrue(again[0]['cached'])
+            self.assertEqual(again[0]['assignments'], by_id[1]['assignments'])
+        finally:
+            server.close()
+
+    def test_close_cancels(self):
+        instance = to_json(generate('layered', 400, seed=1), 3)
+        server = SolverServer(ServerConfig(workers=1))
+        responses = []
+        serving = threading.Thread(target=server.serve, args=([json.dumps({'id': 1, 'instance': instance, 'budget': {'seconds': 600}})], responses.append))
+        serving.start()
+        time.sleep(1)
+        start = time.perf_counter()
+        server.close()
+        serving.join()
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(responses[0]['stop_reason'], "cancelled")
+
+    def test_write_fails(self):
+        def write(response):
+            raise BrokenPipeError()
+        request = {'instance': self.basic2, 'budget': {'iterations': 20}}
+        server = SolverServer(ServerConfig(workers=1))
+        try:
+            errors = []
+            def serve():
+                try:
+                    server.serve([json.dumps(dict(request, id=i)) for i in range(3)], write)
+                except BrokenPipeError as e:
+                    errors.append(e)
+            serving = threading.Thread(target=serve)
+            serving.start()
+            serving.join(30)
+            self.assertFalse(serving.is_alive())
+            self.assertEqual(len(errors), 1)
+        finally:
+            server.close()
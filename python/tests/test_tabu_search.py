@@ -1,8 +1,10 @@
 import unittest
 import copy
+import random
 import pprint
 from tabu_search.input_types import *
-from tabu_search.types import build_graph
+from tabu_search.instance_generator import generate, uniform_durations
+from tabu_search.types import Neighbourhood, build_graph
 import networkx
 
 class GraphUtilTest(unittest.TestCase):
@@ -55,3 +57,139 @@ class GraphUtilTest(unittest.TestCase):
             print(graph.assignments)
             self.assertEqual(assignments_before, graph.assignments)
             self.assertEqual(assignment_pointers_before, graph.assignment_pointers)
+
+    def test_schedule(self):
+        graph = build_graph(self.basic2)
+        graph.update_assignments({'John': ['D', 'E', 'C'], 'Frank': ['F', 'B', 'A']})
+        self.assertEqual(graph.completion_time(), 9)
+        self.assertEqual(graph.start_times, {'D': 0, 'E': 2, 'C': 4, 'F': 0, 'B': 2, 'A': 8})
+        self.assertEqual(graph.earliest_finish('B'), 5)
+        self.assertEqual(graph.critical_path(), ['D', 'E', 'C', 'A'])
+
+        # the schedule is dropped and rebuilt after a move
+        graph.apply_move('F', (('Frank', 0), ('John', 0)))
+        self.assertEqual(graph.completion_time(), 10)
+
+
+    def test_wide_graph(self):
+        # every layer depends on every node of the layer below, which used to
+        # make the recursive evaluation exponential in the number of layers
+        operations = generate('layered', 120, width=4, fan_in=4, durations=lambda rng: 1)
+        graph = build_graph(operations)
+        graph.update_assignments({'John': [o.name for o in operations]})
+        self.assertEqual(graph.completion_time(), len(operations) - 1) # the end task takes no time
+        self.assertEqual(len(graph.critical_path()), len(operations))
+
+    def test_incremental_transitive_deps(self):
+        rng = random.Random(7)
+        operations = generate('layered', 15, width=3, durations=uniform_durations(1, 5), seed=7)
+        graph = build_graph(operations)
+        graph.update_assignments({'John': [o.name for o in operations], 'Frank': [], 'Bob': []})
+        rebuilt = build_graph(operations)
+        for _ in range(200):
+            node, move = rng.choice(sorted(graph.get_valid_moves()))
+            graph.apply_move(node, move)
+            rebuilt.update_assignments(copy.deepcopy(graph.assignments))
+            self.assertEqual(graph.assignment_aware_transitive_deps, rebuilt.assignment_aware_transitive_deps)
+            self.assertEqual(graph.completion_time(), rebuilt.completion_time())
+            for node in graph.topological_order:
+                for w in graph._waits_on(node):
+                    self.assertLess(graph.topological_position[w], graph.topological_position[node])
+
+    def test_evaluate_move(self):
+        rng = random.Random(11)
+        operations = generate('layered', 24, width=4, seed=11)
+        graph = build_graph(operations)
+        names = [o.name for o in operations]
+        graph.update_assignments({'John': names[0::3], 'Frank': names[1::3], 'Bob': names[2::3]})
+        for _ in range(100):
+            moves = sorted(graph.get_valid_moves())
+            assignments_before = graph.assignments
+            # every move is scored without touching the graph
+            scores = {move: graph.evaluate_move(*move) for move in moves}
+            self.assertEqual(assignments_before, graph.assignments)
+            self.assertGreater(graph.estimate_move(*rng.choice(moves)), 0)
+            node, move = rng.choice(moves)
+            graph.apply_move(node, move)
+            self.assertEqual(graph.completion_time(), scores[(node, move)])
+            # the schedule patched by the move matches one computed from scratch
+            patched = (list(graph.start), list(graph.finish))
+            graph.update_schedule()
+            self.assertEqual(patched, (list(graph.start), list(graph.finish)))
+
+    def test_processing_times(self):
+        rng = random.Random(5)
+        employees = ['John', 'Frank', 'Bob']
+        operations = generate('layered', 20, width=4, seed=5)
+        for o in operations[:-1]:
+            o.eligible = rng.sample(employees, rng.randint(1, 3))
+            o.processing_times = {e: rng.randint(1, 9) for e in o.eligible if rng.random() < 0.5}
+        graph = build_graph(operations, employees)
+        by_name = {o.name: o for o in operations}
+        assignments = {e: [] for e in employees}
+        for o in operations:
+            assignments[(o.eligible or employees)[0]].append(o.name)
+        graph.update_assignments(assignments)
+        for _ in range(60):
+            moves = sorted(graph.get_valid_moves())
+            # nobody is ever offered a task they can't do
+            for node, (_, (employee, _)) in moves + sorted(graph.sample_moves(Neighbourhood.N7, 10, rng)):
+                self.assertIn(employee, by_name[node].eligible or employees)
+            scores = {move: graph.evaluate_move(*move) for move in moves}
+            node, move = rng.choice(moves)
+            graph.apply_move(node, move)
+            self.assertEqual(graph.completion_time(), scores[(node, move)])
+            patched = (list(graph.start), list(graph.finish))
+            graph.update_schedule()
+            self.assertEqual(patched, (list(graph.start), list(graph.finish)))
+            for e, tasks in graph.assignments.items():
+                durations = [(by_name[t].processing_times or {}).get(e, by_name[t].duration) for t in tasks]
+                self.assertEqual(graph.machine_load[graph.employee_ids[e]], sum(durations))
+        with self.assertRaisesRegex(ValueError, "can't do"):
+            graph.update_assignments({'John': [o.name for o in operations if o.eligible and 'John' not in o.eligible][:1], 'Frank': [], 'Bob': []})
+
+    def test_critical_neighbourhoods(self):
+        rng = random.Random(3)
+        operations = generate('layered', 20, width=4, seed=3)
+        graph = build_graph(operations)
+        names = [o.name for o in operations]
+        graph.update_assignments({'John': names[0::3], 'Frank': names[1::3], 'Bob': names[2::3]})
+        for _ in range(30):
+            # is_valid_move agrees with actually looking for a cycle
+            for node, move in rng.sample(sorted(graph.iter_moves()), 10):
+                self.assertTrue(graph.is_valid_move(node, move))
+            for _ in range(20):
+                node = rng.choice(names)
+                employee = rng.choice(graph.employees)
+                move = (graph.assignment_pointers[node], (employee, rng.randint(0, len(graph.assignments[employee]))))
+                if move[0][0] == move[1][0] and move[1][1] - move[0][1] in (0, 1):
+                    continue
+                assignments = graph.assignments
+                assignments[move[1][0]].insert(move[1][1], node)
+                assignments[move[0][0]].pop(move[0][1] + (1 if move[0][0] == move[1][0] and move[1][1] <= move[0][1] else 0))
+                try:
+                    build_graph(operations).update_assignments(assignments)
+                    valid = True
+                except ValueError:
+                    valid = False
+                self.assertEqual(graph.is_valid_move(node, move), valid)
+
+            critical = set(graph.critical_path())
+            self.assertEqual([n for block in graph.critical_blocks() for n in block], graph.critical_path())
+            n7 = graph.get_valid_moves(Neighbourhood.N7)
+            n5 = graph.get_valid_moves(Neighbourhood.N5)
+            self.assertTrue(n5 <= n7)
+            self.assertTrue(all(node in critical for node, _ in n7))
+            self.assertTrue(all(graph.is_valid_move(*move) for move in n7))
+            # other employees only get it somewhere around when it runs now
+            ids = graph.compiled.ids
+            for node, ((e, _), (other, i)) in n7:
+                sequence = [ids[t] for t in graph.assignments[other]]
+                if other != e:
+                    self.assertTrue(i == 0 or graph.start[sequence[i - 1]] < graph.finish[ids[node]])
+                    self.assertTrue(i == len(sequence) or graph.finish[sequence[i]] > graph.start[ids[node]])
+            sample = graph.sample_moves(Neighbourhood.N7, 5, rng)
+            self.assertLessEqual(len(sample), 5)
+            self.assertTrue(sample <= n7)
+            node, move = rng.choice(sorted(n7))
+            graph.apply_move(node, move)